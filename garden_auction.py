@@ -0,0 +1,64 @@
+"""Auction economy for Garden Tic-Tac-Toe.
+
+Bids, payouts and the game outcome they are settled on. Every random draw
+takes an ``rng`` (anything with ``randint``), which defaults to the
+``random`` module so the app keeps its global generator.
+"""
+import random
+
+from garden_engine import FLOWER, BUTTERFLY, BEE
+
+STARTING_COINS = 1000
+MIN_BET = 10
+MAX_BET = 500
+AUCTION_INCREMENT = 5
+# Bees on a full board needed for the Bees to take the pot instead of a draw
+BEE_WIN_THRESHOLD = 5
+
+def calculate_ai_bid(difficulty, player_bid, rng=random):
+    """AI determines its bid based on difficulty"""
+    base_bid = {
+        'Easy': int(player_bid * 0.6),
+        'Medium': int(player_bid * 0.9),
+        'Hard': int(player_bid * 1.2)
+    }.get(difficulty, player_bid)
+    
+    # Add some randomness
+    variation = rng.randint(-10, 20)
+    return max(MIN_BET, base_bid + variation)
+
+def calculate_bee_bid(rng=random):
+    """Bees always bid a random amount"""
+    return rng.randint(MIN_BET, MIN_BET + 30)
+
+def calculate_auction_payout(winner, player_bid, ai_bid, bee_bid, bee_interruptions):
+    """Calculate payout based on auction winner-takes-all"""
+    total_pot = player_bid + ai_bid + bee_bid
+    
+    if winner == 'Flowers':  # Player wins
+        # Player gets the total pot minus their own bid (net gain)
+        payout = total_pot
+        return payout, total_pot
+    
+    elif winner == 'Butterflies':  # AI wins
+        # Player loses their bid
+        return 0, total_pot
+    
+    elif winner == 'Bees':  # Bees win (board full due to bees)
+        # Bees take all, everyone loses
+        return 0, total_pot
+    
+    else:  # Draw
+        # Everyone gets their bid back
+        return player_bid, total_pot
+
+def game_outcome(game):
+    """'Flowers', 'Butterflies', 'Bees' or 'Draw' once the game is over, else None"""
+    if game.check_win(FLOWER):
+        return 'Flowers'
+    if game.check_win(BUTTERFLY):
+        return 'Butterflies'
+    if game.is_board_full():
+        # A full board is the Bees' if they disrupted it enough
+        return 'Bees' if game.count_pieces(BEE) >= BEE_WIN_THRESHOLD else 'Draw'
+    return None
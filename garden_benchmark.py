@@ -0,0 +1,295 @@
+"""Benchmarks for the Garden Tic-Tac-Toe engine hot paths.
+
+Times ``check_win``, ``is_board_full``, ``count_pieces``, ``evaluate_board``,
+``find_fork_moves``, ``get_strategic_bee_move`` and ``get_ai_move`` on a fixed corpus of positions
+(empty, midgame, near-full and bee-heavy boards, generated from a fixed seed)
+for every engine backend, and prints per-call latency percentiles and
+throughput side by side. Results can be saved as a JSON baseline and later
+runs compared against it:
+
+    python garden_benchmark.py --save garden_benchmark_baseline.json
+    python garden_benchmark.py --compare garden_benchmark_baseline.json
+
+A comparison exits non-zero when any median got slower than ``--tolerance``.
+Runs need neither Streamlit nor the database. ``--storage GAMES`` instead
+load-tests every storage backend on fresh temporary files:
+
+    python garden_benchmark.py --storage 5000
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from garden_engine import (
+    BOARD_SIZE, WIN_LENGTH, FLOWER, BUTTERFLY, BEE, ENGINE_BACKENDS
+)
+import garden_storage
+
+CORPUS_SEED = 20240601
+POSITIONS_PER_CATEGORY = 20
+# Move counts and share of bee moves per corpus category
+CORPUS_CATEGORIES = {
+    'empty': (0, 0, 0.0),
+    'midgame': (8, 12, 0.1),
+    'near-full': (19, 23, 0.1),
+    'bee-heavy': (10, 16, 0.45)
+}
+BENCHMARKS = ('check_win', 'is_board_full', 'count_pieces', 'evaluate_board', 'find_fork_moves',
+              'get_strategic_bee_move', 'get_ai_move')
+# Median slowdown against a baseline that counts as a regression
+DEFAULT_TOLERANCE = 1.25
+
+def build_corpus(seed=CORPUS_SEED, per_category=POSITIONS_PER_CATEGORY, board_size=BOARD_SIZE,
+                 win_length=WIN_LENGTH):
+    """Category -> list of move lists, the same for a given seed on every run and backend.
+    
+    Flowers and Butterflies alternate, bees are mixed in at the category's
+    rate, and positions where either side has already won are skipped.
+    """
+    rng = random.Random(seed)
+    backend = ENGINE_BACKENDS['list']
+    corpus = {}
+    for category, (low, high, bee_rate) in CORPUS_CATEGORIES.items():
+        positions = []
+        while len(positions) < per_category:
+            game = backend('Medium', board_size, win_length)
+            cells = [(i, j) for i in range(board_size) for j in range(board_size)]
+            rng.shuffle(cells)
+            moves = []
+            turn = FLOWER
+            for row, col in cells[:rng.randint(low, high)]:
+                player = BEE if rng.random() < bee_rate else turn
+                if player != BEE:
+                    turn = BUTTERFLY if turn == FLOWER else FLOWER
+                game.make_move(row, col, player)
+                moves.append((player, row, col))
+            if not game.check_win(FLOWER) and not game.check_win(BUTTERFLY):
+                positions.append(moves)
+        corpus[category] = positions
+    return corpus
+
+def _replay(backend, moves, difficulty, board_size, win_length):
+    game = ENGINE_BACKENDS[backend](difficulty, board_size, win_length)
+    for player, row, col in moves:
+        game.make_move(row, col, player)
+    return game
+
+def _calls(game, name):
+    """A zero-argument callable running one benchmark on game, Butterflies to move"""
+    if name == 'check_win':
+        return lambda: game.check_win(BUTTERFLY)
+    if name == 'is_board_full':
+        return game.is_board_full
+    if name == 'count_pieces':
+        return lambda: game.count_pieces(BEE)
+    if name == 'evaluate_board':
+        return lambda: game.evaluate_board(BUTTERFLY, FLOWER)
+    if name == 'find_fork_moves':
+        return lambda: game.find_fork_moves(BUTTERFLY)
+    if name == 'get_strategic_bee_move':
+        return lambda: game.get_strategic_bee_move(BUTTERFLY)
+    # No transposition table, so repeated calls do not answer from earlier ones
+    return lambda: game.get_ai_move(BUTTERFLY, FLOWER)
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def _timer_overhead(trials=1000):
+    """Smallest reading of two back-to-back perf_counter calls, taken off every single-call timing"""
+    clock = time.perf_counter
+    return min(-clock() + clock() for _ in range(trials))
+
+TIMER_OVERHEAD = _timer_overhead()
+
+def time_calls(fn, min_time=0.002, rounds=5, calls=100):
+    """Seconds of ``calls`` individually timed calls of fn, and its mean seconds per call.
+    
+    The single-call timings give the latency distribution, tails included;
+    the mean comes from a few rounds of a loop running for at least
+    min_time each, so throughput is not skewed by the timer's overhead.
+    """
+    clock = time.perf_counter
+    samples = []
+    for _ in range(calls):
+        started = clock()
+        fn()
+        samples.append(max(0.0, clock() - started - TIMER_OVERHEAD))
+    
+    number = 1
+    while True:
+        started = clock()
+        for _ in range(number):
+            fn()
+        elapsed = clock() - started
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 4
+    total, count = elapsed, number
+    for _ in range(rounds - 1):
+        started = clock()
+        for _ in range(number):
+            fn()
+        total += clock() - started
+        count += number
+    return samples, total / count
+
+def run_benchmarks(backends=None, benchmarks=BENCHMARKS, difficulty='Easy', corpus=None,
+                   board_size=BOARD_SIZE, win_length=WIN_LENGTH, progress=None):
+    """Backend -> benchmark -> category -> latency summary in microseconds.
+    
+    Every position of the category is timed separately. The percentiles and
+    the maximum are over the single calls of all positions, while the mean
+    and ``per_second`` (positions handled per second) come from the looped
+    timings.
+    """
+    corpus = corpus if corpus is not None else build_corpus(board_size=board_size, win_length=win_length)
+    results = {}
+    for backend in backends or list(ENGINE_BACKENDS):
+        results[backend] = {}
+        for name in benchmarks:
+            results[backend][name] = {}
+            for category, positions in corpus.items():
+                samples = []
+                means = []
+                for moves in positions:
+                    game = _replay(backend, moves, difficulty, board_size, win_length)
+                    calls, mean = time_calls(_calls(game, name))
+                    samples.extend(calls)
+                    means.append(mean)
+                mean = sum(means) / len(means)
+                results[backend][name][category] = {
+                    'p50_us': _percentile(samples, 0.50) * 1e6,
+                    'p90_us': _percentile(samples, 0.90) * 1e6,
+                    'p99_us': _percentile(samples, 0.99) * 1e6,
+                    'mean_us': mean * 1e6,
+                    'max_us': max(samples) * 1e6,
+                    'per_second': 1 / mean if mean else 0.0
+                }
+                if progress:
+                    progress(backend, name, category)
+    return results
+
+def report(results, baseline=None, tolerance=DEFAULT_TOLERANCE):
+    """Print latencies and throughput per backend side by side; returns the regressions against baseline"""
+    backends = list(results)
+    first = results[backends[0]]
+    header = f"{'benchmark':<24} {'category':<10}" + ''.join(f" {b + ' p50':>14} {'p99':>10} {'per s':>10}" for b in backends)
+    if baseline:
+        header += f" {'vs baseline':>12}"
+    print(header)
+    regressions = []
+    for name in first:
+        for category in first[name]:
+            line = f"{name:<24} {category:<10}"
+            ratios = []
+            for backend in backends:
+                stats = results[backend][name][category]
+                line += f" {stats['p50_us']:>11.2f} us {stats['p99_us']:>7.1f} us {stats['per_second']:>10.0f}"
+                old = (baseline or {}).get(backend, {}).get(name, {}).get(category)
+                if old:
+                    ratio = stats['p50_us'] / old['p50_us'] if old['p50_us'] else 1.0
+                    ratios.append(ratio)
+                    if ratio > tolerance:
+                        regressions.append((backend, name, category, ratio))
+            if ratios:
+                line += f" {max(ratios):>11.2f}x"
+            print(line)
+    return regressions
+
+def run_storage_benchmark(games, backends=None, users=50, seed=CORPUS_SEED):
+    """Backend -> games settled per second and statistics read latencies in milliseconds.
+    
+    Every game reserves a bid and settles it the way the app does, for one
+    of ``users`` users, with a corpus-style move list; then the app's
+    statistics reads are timed against the stored history.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in backends or list(garden_storage.STORAGE_BACKENDS):
+            options = {'path': os.path.join(directory, f'{backend}.store')} if backend != 'memory' else {}
+            garden_storage.use_storage(backend, **options)
+            rng = random.Random(seed)
+            moves = [(FLOWER if i % 2 == 0 else BUTTERFLY, i // BOARD_SIZE, i % BOARD_SIZE) for i in range(9)]
+            started = time.perf_counter()
+            for index in range(games):
+                user = f'user{index % users}'
+                bid = rng.choice((10, 50, 100))
+                game = garden_storage.reserve_bet(bid, user)
+                if game:
+                    winner = rng.choice(('Flowers', 'Butterflies', 'Bees', 'Draw'))
+                    payout = {'Flowers': 3 * bid, 'Draw': bid}.get(winner, 0)
+                    garden_storage.settle_game(winner, rng.choice(('Easy', 'Medium', 'Hard')), len(moves), 0, bid,
+                                               bid, 20, payout, moves, user=user, game=game, write_behind=False)
+            elapsed = time.perf_counter() - started
+            results[backend] = {'games_per_second': games / elapsed if elapsed else 0.0}
+            for name, read in (('statistics', garden_storage.load_statistics),
+                               ('by_difficulty', lambda: garden_storage.load_statistics_by('difficulty')),
+                               ('last_24h', lambda: garden_storage.load_statistics_since(24)),
+                               ('history', lambda: garden_storage.load_history(168)),
+                               ('recent_page', garden_storage.load_recent_games)):
+                samples, _ = time_calls(read, calls=20)
+                results[backend][name + '_ms'] = _percentile(samples, 0.50) * 1e3
+            garden_storage.use_storage('memory')
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Garden Tic-Tac-Toe engine")
+    parser.add_argument('--backend', nargs='+', default=list(ENGINE_BACKENDS), choices=list(ENGINE_BACKENDS),
+                        help="engine backends to compare")
+    parser.add_argument('--bench', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS),
+                        help="hot paths to time")
+    parser.add_argument('--difficulty', default='Easy', choices=['Easy', 'Medium', 'Hard'],
+                        help="difficulty get_ai_move plays at")
+    parser.add_argument('--positions', type=int, default=POSITIONS_PER_CATEGORY, help="positions per corpus category")
+    parser.add_argument('--save', metavar='PATH', help="write the results as a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="JSON baseline to compare medians against")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="median slowdown against the baseline reported as a regression")
+    parser.add_argument('--storage', type=int, metavar='GAMES',
+                        help="load-test the storage backends with this many games instead")
+    args = parser.parse_args()
+    
+    if args.storage:
+        results = run_storage_benchmark(args.storage)
+        columns = list(next(iter(results.values())))
+        print(f"{'storage':<8}" + ''.join(f" {column:>18}" for column in columns))
+        for backend, stats in results.items():
+            print(f"{backend:<8}" + ''.join(f" {stats[column]:>18.3f}" for column in columns))
+        return
+    
+    corpus = build_corpus(per_category=args.positions)
+    results = run_benchmarks(args.backend, args.bench, args.difficulty, corpus,
+                             progress=lambda *step: print(f"\r{' / '.join(step):<60}", end='', flush=True))
+    print('\r' + ' ' * 60 + '\r', end='')
+    
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    regressions = report(results, baseline, args.tolerance)
+    
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'difficulty': args.difficulty,
+                'corpus_seed': CORPUS_SEED,
+                'positions': args.positions,
+                'results': results
+            }, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.save}")
+    
+    if regressions:
+        for backend, name, category, ratio in regressions:
+            print(f"REGRESSION {backend} {name} [{category}]: {ratio:.2f}x the baseline median")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
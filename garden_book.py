@@ -0,0 +1,138 @@
+"""Opening book for the Garden Tic-Tac-Toe AI.
+
+The book maps early positions, reduced to their canonical form under the
+board symmetries, with the AI to move to the move the engine chose for
+them. It is built offline and loaded once per process:
+
+    python garden_book.py --plies 4 --time 3
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+from garden_engine import (
+    BOARD_SIZE, WIN_LENGTH, EMPTY, FLOWER, BUTTERFLY, DIFFICULTY_SEARCH,
+    Move, TranspositionTable, new_game, to_canonical_cell, from_canonical_cell
+)
+
+OPENING_BOOK_PATH = 'garden_opening_book.json'
+
+class OpeningBook:
+    """Canonical position plus side to move -> (move, score), moves in the canonical frame"""
+    
+    def __init__(self, entries=None, board_size=BOARD_SIZE, win_length=WIN_LENGTH):
+        self.entries = entries if entries is not None else {}
+        self.board_size = board_size
+        self.win_length = win_length
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def lookup(self, game, side):
+        """Book move for side to play in game, or None if the position is not covered"""
+        if not self.entries or (game.size, game.win_length) != (self.board_size, self.win_length):
+            return None
+        cells, transform = game.canonical_position()
+        entry = self.entries.get(cells + side)
+        if entry is None:
+            return None
+        move_idx, score = entry
+        row, col = from_canonical_cell(move_idx // self.board_size, move_idx % self.board_size,
+                                       transform, self.board_size)
+        if not game.is_valid_move(row, col):
+            return None
+        return Move(row, col, score)
+    
+    def add(self, game, side, move):
+        cells, transform = game.canonical_position()
+        row, col = to_canonical_cell(move.row, move.col, transform, self.board_size)
+        self.entries[cells + side] = (row * self.board_size + col, move.score)
+    
+    def save(self, path=OPENING_BOOK_PATH):
+        with open(path, 'w') as f:
+            json.dump({
+                'board_size': self.board_size,
+                'win_length': self.win_length,
+                'entries': self.entries
+            }, f, separators=(',', ':'), sort_keys=True)
+    
+    @classmethod
+    def load(cls, path=OPENING_BOOK_PATH):
+        with open(path) as f:
+            data = json.load(f)
+        entries = {key: tuple(value) for key, value in data['entries'].items()}
+        return cls(entries, data['board_size'], data['win_length'])
+
+_books = {}
+_books_lock = threading.Lock()
+
+def load_opening_book(path=OPENING_BOOK_PATH):
+    """Load the book at path once per process; a missing file gives an empty book"""
+    book = _books.get(path)
+    if book is None:
+        with _books_lock:
+            book = _books.get(path)
+            if book is None:
+                book = OpeningBook.load(path) if os.path.exists(path) else OpeningBook()
+                _books[path] = book
+    return book
+
+def _replay(moves):
+    game = new_game('Hard')
+    for player, row, col in moves:
+        game.make_move(row, col, player)
+    return game
+
+def build_opening_book(plies=4, max_depth=DIFFICULTY_SEARCH['Hard']['depth'], time_budget=3.0, progress=None):
+    """Expand the first plies from the empty board and record the engine's move at every AI turn.
+    
+    The human always moves first, as either Flowers or Butterflies. Every
+    human move is expanded while the AI only follows its own choice, and
+    positions are de-duplicated by symmetry at each ply. Moves are searched
+    the way Hard, the difficulty playing from the book, searches them, bee
+    interruptions included.
+    """
+    book = OpeningBook()
+    table = TranspositionTable()
+    for human in (FLOWER, BUTTERFLY):
+        ai = BUTTERFLY if human == FLOWER else FLOWER
+        frontier = [[]]
+        for ply in range(plies):
+            next_frontier = {}
+            for moves in frontier:
+                game = _replay(moves)
+                if ply % 2 == 0:
+                    children = [(human, i, j) for i in range(game.size) for j in range(game.size)
+                                if game.board[i][j] == EMPTY]
+                else:
+                    bee_chance = game.bee_chance() if DIFFICULTY_SEARCH['Hard']['bees'] else 0.0
+                    move, _ = game.search_ai_move(ai, human, max_depth, time_budget, table, bee_chance)
+                    book.add(game, ai, move)
+                    if progress:
+                        progress(len(book))
+                    children = [(ai, move.row, move.col)]
+                for child in children:
+                    game.make_move(child[1], child[2], child[0])
+                    next_frontier.setdefault(game.canonical_position()[0], moves + [child])
+                    game.undo_move()
+            frontier = list(next_frontier.values())
+    return book
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Garden Tic-Tac-Toe opening book")
+    parser.add_argument('--plies', type=int, default=4, help="plies from the empty board to cover")
+    parser.add_argument('--depth', type=int, default=DIFFICULTY_SEARCH['Hard']['depth'], help="search depth per position")
+    parser.add_argument('--time', type=float, default=3.0, help="search seconds per position")
+    parser.add_argument('--output', default=OPENING_BOOK_PATH, help="book file to write")
+    args = parser.parse_args()
+    
+    started = time.time()
+    book = build_opening_book(args.plies, args.depth, args.time,
+                              progress=lambda n: print(f"\r{n} positions", end='', flush=True))
+    book.save(args.output)
+    print(f"\nWrote {len(book)} positions to {args.output} in {time.time() - started:.0f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1150 @@
+"""Garden Tic-Tac-Toe game engine: board state, evaluation and AI search.
+
+Nothing here touches Streamlit or the database, so the app, offline tools
+and worker processes can all import it.
+"""
+import random
+import struct
+import time
+from functools import lru_cache
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:  # the scalar engine works without NumPy
+    np = None
+
+# Constants
+BOARD_SIZE = 5
+WIN_LENGTH = 5
+EMPTY = '.'
+FLOWER = 'X'
+BUTTERFLY = 'O'
+BEE = 'B'
+ENGINE_BACKEND = 'list'
+WIN_SCORE = 10000000
+
+# AI strength per difficulty: maximum search depth in plies, wall-clock
+# seconds per move and whether to play from the opening book. Depth 1 is the
+# greedy one-ply scan.
+DIFFICULTY_SEARCH = {
+    'Easy': {'depth': 1, 'time': 0.2, 'book': False, 'bees': False},
+    'Medium': {'depth': 2, 'time': 0.5, 'book': False, 'bees': False},
+    'Hard': {'depth': 8, 'time': 1.5, 'book': True, 'bees': True}
+}
+# Chance that the bees take the AI's turn after a human move, by difficulty
+BEE_CHANCE = {
+    'Easy': 0.10,
+    'Medium': 0.20,
+    'Hard': 0.25
+}
+DEFAULT_BEE_CHANCE = 0.15
+# Bees only interrupt once more than this many moves have been played
+BEE_MIN_MOVES = 4
+# Memory cap for the process-wide transposition table
+TT_MAX_BYTES = 32 * 1024 * 1024
+# Moves considered by the AI: empty cells within this many steps (in any
+# direction) of a piece already on the board
+CANDIDATE_DISTANCE = 2
+# Positions scored per NumPy pass by best_moves_batch
+BATCH_CHUNK_SIZE = 4096
+# Score candidate moves with NumPy in one pass when it is installed and the
+# board is big enough for that to beat the scalar loop (it is not on 5x5)
+VECTORIZED_EVAL = np is not None
+VECTORIZED_MIN_CELLS = 64
+PIECE_CODES = {EMPTY: 0, FLOWER: 1, BUTTERFLY: 2, BEE: 3}
+CODE_PIECES = {code: piece for piece, code in PIECE_CODES.items()}
+# Compact game state (to_bytes): format version, board size, win length,
+# difficulty index and bee interruptions, followed by the packed move list
+STATE_VERSION = 1
+STATE_HEADER = struct.Struct('>BBBBH')
+DIFFICULTIES = tuple(DIFFICULTY_SEARCH)
+
+def _symmetry_permutations(size):
+    """Cell permutations for the 8 symmetries of a size x size board; perm[idx] is where idx lands"""
+    last = size - 1
+    transforms = (
+        lambda r, c: (r, c),
+        lambda r, c: (c, last - r),          # rotate 90
+        lambda r, c: (last - r, last - c),   # rotate 180
+        lambda r, c: (last - c, r),          # rotate 270
+        lambda r, c: (r, last - c),          # mirror left-right
+        lambda r, c: (last - r, c),          # mirror top-bottom
+        lambda r, c: (c, r),                 # main diagonal
+        lambda r, c: (last - c, last - r),   # anti-diagonal
+    )
+    perms = []
+    for transform in transforms:
+        perm = [0] * (size * size)
+        for r in range(size):
+            for c in range(size):
+                tr, tc = transform(r, c)
+                perm[r * size + c] = tr * size + tc
+        perms.append(tuple(perm))
+    return tuple(perms)
+
+@lru_cache(maxsize=None)
+def get_symmetries(size):
+    """(permutations, inverse permutations, inverse gathers) for the 8 symmetries of a size x size board"""
+    perms = _symmetry_permutations(size)
+    inverses = tuple(tuple(sorted(range(len(perm)), key=perm.__getitem__)) for perm in perms)
+    # Gathering cells in inverse-permutation order builds a transformed board in one C call
+    gathers = tuple(itemgetter(*inverse) for inverse in inverses)
+    return perms, inverses, gathers
+
+def to_canonical_cell(row, col, transform, size=BOARD_SIZE):
+    """Map a cell of a position to the same cell in its canonical form"""
+    return divmod(get_symmetries(size)[0][transform][row * size + col], size)
+
+def from_canonical_cell(row, col, transform, size=BOARD_SIZE):
+    """Map a cell of a canonical form back to the position it was taken from"""
+    return divmod(get_symmetries(size)[1][transform][row * size + col], size)
+
+def _positional_bonus(size, row, col):
+    # Distances from the centre in half-cells, so an even board has a 2x2 centre
+    row_dist = abs(2 * row - (size - 1))
+    col_dist = abs(2 * col - (size - 1))
+    if max(row_dist, col_dist) <= 1: return 50
+    if max(row_dist, col_dist) <= 3: return 30
+    if row_dist == size - 1 and col_dist == size - 1: return 20
+    return 0
+
+class BoardGeometry:
+    """Tables for one (board size, win length) pair, shared by every game using it.
+    
+    ``lines`` holds every window of ``win_length`` cells along rows, columns,
+    diagonals and anti-diagonals, and ``cell_lines`` the ids of the lines
+    through each cell index ``row * size + col``. The all-cells bitmask,
+    symmetry permutations, Zobrist keys, positional bonuses and each cell's
+    neighbours within CANDIDATE_DISTANCE are kept alongside.
+    """
+    
+    def __init__(self, size, win_length):
+        if not 1 < win_length <= size:
+            raise ValueError(f"win length {win_length} does not fit a {size}x{size} board")
+        self.size = size
+        self.win_length = win_length
+        self.num_cells = size * size
+        self.lines = self._generate_lines(size, win_length)
+        cell_lines = [[] for _ in range(self.num_cells)]
+        for line_id, line in enumerate(self.lines):
+            for r, c in line:
+                cell_lines[r * size + c].append(line_id)
+        self.cell_lines = tuple(tuple(ids) for ids in cell_lines)
+        self.full_mask = (1 << self.num_cells) - 1
+        self.symmetries, self.symmetry_inverses, self.symmetry_gathers = get_symmetries(size)
+        self.positional_bonus = tuple(_positional_bonus(size, idx // size, idx % size)
+                                      for idx in range(self.num_cells))
+        self.neighbours = tuple(
+            tuple(r * size + c
+                  for r in range(max(0, row - CANDIDATE_DISTANCE), min(size, row + CANDIDATE_DISTANCE + 1))
+                  for c in range(max(0, col - CANDIDATE_DISTANCE), min(size, col + CANDIDATE_DISTANCE + 1))
+                  if (r, c) != (row, col))
+            for row in range(size) for col in range(size)
+        )
+        # Zobrist keys: one random 64-bit value per (piece, cell) plus one for
+        # Butterflies to move. Seeded so hashes agree across processes, and by
+        # win length too: the transposition table is shared by every geometry,
+        # and the same stones score differently under another k.
+        rng = random.Random(0x6A4D3F + (size << 8) + win_length)
+        self.zobrist_keys = {piece: tuple(rng.getrandbits(64) for _ in range(self.num_cells))
+                             for piece in (FLOWER, BUTTERFLY, BEE)}
+        self.zobrist_side = rng.getrandbits(64)
+        self._array_tables = None
+        self._neighbour_matrix = None
+    
+    def array_tables(self):
+        """NumPy tables for vectorized evaluation, built on first use.
+        
+        Returns ``(line_index, incidence, positional, score_table)``: the cell
+        indexes of each line (lines x win_length), a cells x lines 0/1 matrix,
+        the positional bonus per cell and ``score_line`` tabulated by
+        (player count, opponent count, bee count).
+        """
+        if self._array_tables is None:
+            line_index = np.array([[r * self.size + c for r, c in line] for line in self.lines], dtype=np.intp)
+            incidence = np.zeros((self.num_cells, len(self.lines)), dtype=np.int64)
+            for line_id, cells in enumerate(line_index):
+                incidence[cells, line_id] = 1
+            positional = np.array(self.positional_bonus, dtype=np.int64)
+            k = self.win_length
+            # One spare player row so "count + 1" can be looked up for every line
+            score_table = np.zeros((k + 2, k + 1, k + 1), dtype=np.int64)
+            for player_count in range(k + 1):
+                for opp_count in range(k + 1 - player_count):
+                    for bee_count in range(k + 1 - player_count - opp_count):
+                        score_table[player_count, opp_count, bee_count] = score_line(
+                            player_count, opp_count, k - player_count - opp_count - bee_count, bee_count)
+            self._array_tables = (line_index, incidence, positional, score_table)
+        return self._array_tables
+    
+    def neighbour_matrix(self):
+        """cells x cells 0/1 NumPy matrix of ``neighbours``, built on first use"""
+        if self._neighbour_matrix is None:
+            matrix = np.zeros((self.num_cells, self.num_cells), dtype=np.int32)
+            for idx, cells in enumerate(self.neighbours):
+                matrix[idx, list(cells)] = 1
+            self._neighbour_matrix = matrix
+        return self._neighbour_matrix
+    
+    @staticmethod
+    def _generate_lines(size, win_length):
+        lines = []
+        for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            for r in range(size):
+                for c in range(size):
+                    end_r = r + dr * (win_length - 1)
+                    end_c = c + dc * (win_length - 1)
+                    if 0 <= end_r < size and 0 <= end_c < size:
+                        lines.append(tuple((r + dr * i, c + dc * i) for i in range(win_length)))
+        return tuple(lines)
+
+@lru_cache(maxsize=None)
+def get_geometry(size=BOARD_SIZE, win_length=WIN_LENGTH):
+    """The shared BoardGeometry for a board size and win length, built on first use"""
+    return BoardGeometry(size, win_length)
+
+# Game logic classes
+class Move:
+    __slots__ = ['row', 'col', 'score']
+    
+    def __init__(self, row=-1, col=-1, score=0):
+        self.row = row
+        self.col = col
+        self.score = score
+
+class SearchStats:
+    """Cost of one AI decision and the rule that made it, filled in by get_ai_move.
+    
+    ``branch`` is one of SEARCH_BRANCHES, ``nodes`` the positions searched or
+    moves scored, ``depth`` the deepest completed search ply and ``tt_hits``
+    the transposition table hits during the decision.
+    """
+    __slots__ = ['branch', 'wall_time', 'nodes', 'depth', 'tt_hits']
+    
+    def __init__(self):
+        self.branch = None
+        self.wall_time = 0.0
+        self.nodes = 0
+        self.depth = 0
+        self.tt_hits = 0
+    
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+SEARCH_BRANCHES = ('win', 'block', 'book', 'fork', 'fork-block', 'search', 'eval')
+
+def summarize_search_stats(records):
+    """Totals over a game's SearchStats records"""
+    branches = dict.fromkeys(SEARCH_BRANCHES, 0)
+    for record in records:
+        branches[record.branch] += 1
+    return {
+        'ai_moves': len(records),
+        'total_time': sum(record.wall_time for record in records),
+        'max_time': max((record.wall_time for record in records), default=0.0),
+        'total_nodes': sum(record.nodes for record in records),
+        'max_depth': max((record.depth for record in records), default=0),
+        'tt_hits': sum(record.tt_hits for record in records),
+        'branches': branches
+    }
+
+# Value of a line held by one side only, indexed by how many empty cells it
+# still needs: complete, one short, two short, ... A lone stone (the last
+# entry) only counts for the player.
+LINE_SCORES = (100000, 10000, 1000, 100, 10)
+
+def score_line(player_count, opp_count, empty_count, bee_count=0):
+    """Score one line from the player's point of view given its piece counts"""
+    if (player_count > 0 and opp_count > 0) or bee_count > 0:
+        return 0
+    
+    if player_count and empty_count < len(LINE_SCORES):
+        return LINE_SCORES[empty_count]
+    if opp_count and empty_count < len(LINE_SCORES) - 1:
+        return -LINE_SCORES[empty_count]
+    
+    return 0
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(bits):
+        return bin(bits).count('1')
+
+class GardenTicTacToe:
+    __slots__ = ['geometry', 'size', 'win_length', 'board', 'difficulty', 'move_count', 'bee_interruptions',
+                 'move_history', 'line_counts', 'line_scores', 'scores', 'zobrist_hashes', 'nearby_pieces',
+                 'candidates', 'open_lines', 'win_cells', 'setup_cells']
+    
+    def __init__(self, difficulty='Medium', board_size=BOARD_SIZE, win_length=WIN_LENGTH):
+        self.geometry = get_geometry(board_size, win_length)
+        self.size = board_size
+        self.win_length = win_length
+        self.board = [[EMPTY for _ in range(board_size)] for _ in range(board_size)]
+        self.difficulty = difficulty
+        self.move_count = 0
+        self.bee_interruptions = 0
+        self.move_history = []
+        # Per-line piece counts and line scores, kept current by _set_cell so
+        # evaluating a position or a candidate move never rescans the board
+        num_lines = len(self.geometry.lines)
+        self.line_counts = {FLOWER: [0] * num_lines, BUTTERFLY: [0] * num_lines, BEE: [0] * num_lines}
+        self.line_scores = {FLOWER: [0] * num_lines, BUTTERFLY: [0] * num_lines}
+        self.scores = {FLOWER: 0, BUTTERFLY: 0}
+        # Zobrist hash of the position under each of the 8 board symmetries;
+        # index 0 is the identity
+        self.zobrist_hashes = [0] * len(self.geometry.symmetries)
+        # Candidate moves: empty cells with at least one piece within
+        # CANDIDATE_DISTANCE, tracked through per-cell counts of nearby pieces
+        self.nearby_pieces = [0] * self.geometry.num_cells
+        self.candidates = set()
+        # Threat index: open lines (no opponent pieces, no bees) per player by
+        # how many of the player's pieces they hold, plus, per empty cell, how
+        # many open lines it would complete (win_cells) or turn into a
+        # one-move threat (setup_cells). Kept current by _set_cell so wins,
+        # blocks and forks are read off without scanning the board.
+        self.open_lines = {player: [set() for _ in range(win_length + 1)] for player in (FLOWER, BUTTERFLY)}
+        self.win_cells = {FLOWER: {}, BUTTERFLY: {}}
+        self.setup_cells = {FLOWER: {}, BUTTERFLY: {}}
+        for line_id in range(num_lines):
+            self._index_line(line_id, 1)
+        
+    def is_valid_move(self, row, col):
+        return 0 <= row < self.size and 0 <= col < self.size and self.board[row][col] == EMPTY
+    
+    def _set_cell(self, row, col, piece):
+        """Write a cell; every board mutation, including trial placements, goes through here"""
+        old = self.board[row][col]
+        idx = row * self.size + col
+        line_ids = self.geometry.cell_lines[idx]
+        for line_id in line_ids:
+            self._index_line(line_id, -1)
+        self.board[row][col] = piece
+        if old != EMPTY:
+            self._toggle_zobrist(self.geometry.zobrist_keys[old], idx)
+            counts = self.line_counts[old]
+            for line_id in line_ids:
+                counts[line_id] -= 1
+        if piece != EMPTY:
+            self._toggle_zobrist(self.geometry.zobrist_keys[piece], idx)
+            counts = self.line_counts[piece]
+            for line_id in line_ids:
+                counts[line_id] += 1
+        for line_id in line_ids:
+            self._rescore_line(line_id)
+            self._index_line(line_id, 1)
+        if old == EMPTY and piece != EMPTY:
+            self._add_nearby(idx)
+        elif old != EMPTY and piece == EMPTY:
+            self._remove_nearby(idx)
+    
+    def _add_nearby(self, idx):
+        nearby = self.nearby_pieces
+        self.candidates.discard(idx)
+        for cell in self.geometry.neighbours[idx]:
+            nearby[cell] += 1
+            if nearby[cell] == 1 and self.board[cell // self.size][cell % self.size] == EMPTY:
+                self.candidates.add(cell)
+    
+    def _remove_nearby(self, idx):
+        nearby = self.nearby_pieces
+        for cell in self.geometry.neighbours[idx]:
+            nearby[cell] -= 1
+            if nearby[cell] == 0:
+                self.candidates.discard(cell)
+        if nearby[idx]:
+            self.candidates.add(idx)
+    
+    def candidate_cells(self):
+        """Cell indexes the AI considers, row-major; every empty cell while no piece is down"""
+        if self.candidates:
+            return sorted(self.candidates)
+        return [idx for idx in range(self.geometry.num_cells)
+                if self.board[idx // self.size][idx % self.size] == EMPTY]
+    
+    def candidate_moves(self):
+        size = self.size
+        return [(idx // size, idx % size) for idx in self.candidate_cells()]
+    
+    def _toggle_zobrist(self, keys, idx):
+        hashes = self.zobrist_hashes
+        for transform, perm in enumerate(self.geometry.symmetries):
+            hashes[transform] ^= keys[perm[idx]]
+    
+    def _rescore_line(self, line_id):
+        flowers = self.line_counts[FLOWER][line_id]
+        butterflies = self.line_counts[BUTTERFLY][line_id]
+        bees = self.line_counts[BEE][line_id]
+        empty = self.win_length - flowers - butterflies - bees
+        for player, player_count, opp_count in ((FLOWER, flowers, butterflies),
+                                                (BUTTERFLY, butterflies, flowers)):
+            score = score_line(player_count, opp_count, empty, bees)
+            self.scores[player] += score - self.line_scores[player][line_id]
+            self.line_scores[player][line_id] = score
+    
+    def _index_line(self, line_id, sign):
+        """Add (sign 1) or remove (sign -1) a line's entries in the threat index"""
+        counts = self.line_counts
+        if counts[BEE][line_id]:
+            return
+        flowers = counts[FLOWER][line_id]
+        butterflies = counts[BUTTERFLY][line_id]
+        if flowers and butterflies:
+            return
+        # An open line is open for both players only while it is empty
+        for player, player_count in ((FLOWER, flowers), (BUTTERFLY, butterflies)):
+            if player_count != flowers + butterflies:
+                continue
+            if sign > 0:
+                self.open_lines[player][player_count].add(line_id)
+            else:
+                self.open_lines[player][player_count].discard(line_id)
+            gaps = self.win_length - player_count
+            if gaps == 1:
+                cells = self.win_cells[player]
+            elif gaps == 2:
+                cells = self.setup_cells[player]
+            else:
+                continue
+            board = self.board
+            size = self.size
+            for r, c in self.geometry.lines[line_id]:
+                if board[r][c] == EMPTY:
+                    cell = r * size + c
+                    count = cells.get(cell, 0) + sign
+                    if count:
+                        cells[cell] = count
+                    else:
+                        del cells[cell]
+    
+    def make_move(self, row, col, player):
+        if not self.is_valid_move(row, col):
+            return False
+        self._set_cell(row, col, player)
+        self.move_count += 1
+        self.move_history.append((player, row, col))
+        return True
+    
+    def to_bytes(self):
+        """Compact state: a 6-byte header and the move list at one byte per move (two above 8x8).
+        
+        Everything else (board, line counts, scores, hashes, threat index) is
+        derived and rebuilt by from_bytes replaying the moves.
+        """
+        header = STATE_HEADER.pack(STATE_VERSION, self.size, self.win_length,
+                                   DIFFICULTIES.index(self.difficulty), self.bee_interruptions)
+        return header + pack_moves(self.move_history, self.size)
+    
+    @classmethod
+    def from_bytes(cls, data):
+        version, size, win_length, difficulty, bee_interruptions = STATE_HEADER.unpack_from(data)
+        if version != STATE_VERSION:
+            raise ValueError(f"unsupported game state version {version}")
+        game = cls(DIFFICULTIES[difficulty], size, win_length)
+        for player, row, col in unpack_moves(data[STATE_HEADER.size:], size):
+            game.make_move(row, col, player)
+        game.bee_interruptions = bee_interruptions
+        return game
+    
+    def undo_move(self):
+        """Take back the last move; returns its (player, row, col) or None"""
+        if not self.move_history:
+            return None
+        player, row, col = self.move_history.pop()
+        self._set_cell(row, col, EMPTY)
+        self.move_count -= 1
+        return player, row, col
+    
+    def get_all_lines(self):
+        return self.geometry.lines
+    
+    def evaluate_line(self, line, player, opponent):
+        player_count = sum(1 for r, c in line if self.board[r][c] == player)
+        opp_count = sum(1 for r, c in line if self.board[r][c] == opponent)
+        empty_count = sum(1 for r, c in line if self.board[r][c] == EMPTY)
+        bee_count = sum(1 for r, c in line if self.board[r][c] == BEE)
+        return score_line(player_count, opp_count, empty_count, bee_count)
+    
+    def evaluate_board(self, player, opponent):
+        # Running total maintained by _set_cell; opponent is always the other side
+        return self.scores[player]
+    
+    def score_move(self, row, col, player, opponent):
+        """evaluate_board(player, opponent) as it would be after player takes (row, col)"""
+        flowers = self.line_counts[FLOWER]
+        butterflies = self.line_counts[BUTTERFLY]
+        bees = self.line_counts[BEE]
+        player_counts, opp_counts = (flowers, butterflies) if player == FLOWER else (butterflies, flowers)
+        line_scores = self.line_scores[player]
+        score = self.scores[player]
+        for line_id in self.geometry.cell_lines[row * self.size + col]:
+            player_count = player_counts[line_id] + 1
+            opp_count = opp_counts[line_id]
+            bee_count = bees[line_id]
+            score += score_line(player_count, opp_count,
+                                self.win_length - player_count - opp_count - bee_count,
+                                bee_count) - line_scores[line_id]
+        return score
+    
+    def get_positional_bonus(self, row, col):
+        return self.geometry.positional_bonus[row * self.size + col]
+    
+    def find_immediate_win(self, player):
+        cells = self.win_cells[player]
+        if not cells:
+            return Move()
+        idx = min(cells)
+        return Move(idx // self.size, idx % self.size, 100000)
+    
+    def count_winning_threats(self, player):
+        return len(self.open_lines[player][self.win_length - 1])
+    
+    def find_fork_moves(self, player):
+        # Playing a cell completes the threats it is the gap of and turns the
+        # open lines it sets up into new threats; every other threat stays
+        threats = self.count_winning_threats(player)
+        wins = self.win_cells[player]
+        setups = self.setup_cells[player]
+        fork_moves = []
+        for idx in self.candidate_cells():
+            count = threats - wins.get(idx, 0) + setups.get(idx, 0)
+            if count >= 2:
+                fork_moves.append(Move(idx // self.size, idx % self.size, count * 1000))
+        return sorted(fork_moves, key=lambda x: x.score, reverse=True)
+    
+    def get_ai_move(self, ai_player, human_player, table=None, book=None, cancel=None, stats=None):
+        """The AI's move and message; pass a SearchStats as ``stats`` to have it filled in"""
+        if stats is None:
+            return self._choose_ai_move(ai_player, human_player, table, book, cancel, None)
+        started = time.perf_counter()
+        # The shared table's counters are advisory, so concurrent searches can blur tt_hits
+        hits = table.hits if table is not None else 0
+        result = self._choose_ai_move(ai_player, human_player, table, book, cancel, stats)
+        stats.wall_time = time.perf_counter() - started
+        if table is not None:
+            stats.tt_hits = table.hits - hits
+        return result
+    
+    def _choose_ai_move(self, ai_player, human_player, table, book, cancel, stats):
+        win_move = self.find_immediate_win(ai_player)
+        if win_move.row != -1:
+            if stats is not None:
+                stats.branch = 'win'
+            return win_move, "🎯 AI found winning move!"
+        
+        block_move = self.find_immediate_win(human_player)
+        if block_move.row != -1:
+            if stats is not None:
+                stats.branch = 'block'
+            return block_move, "🛡️ AI blocking your winning move!"
+        
+        budget = DIFFICULTY_SEARCH.get(self.difficulty, DIFFICULTY_SEARCH['Medium'])
+        if book is not None and budget['book']:
+            book_move = book.lookup(self, ai_player)
+            if book_move is not None:
+                if stats is not None:
+                    stats.branch = 'book'
+                return book_move, "📖 AI plays from its opening book!"
+        
+        if budget['depth'] > 1:
+            bee_chance = self.bee_chance() if budget['bees'] else 0.0
+            return self.search_ai_move(ai_player, human_player, budget['depth'], budget['time'], table,
+                                       bee_chance, cancel, stats)
+        
+        if stats is not None:
+            stats.branch = 'eval'
+            stats.depth = 1
+            stats.nodes = len(self.candidate_cells())
+        if VECTORIZED_EVAL and self.geometry.num_cells >= VECTORIZED_MIN_CELLS:
+            cells, scores = score_candidates_vectorized(self, ai_player, human_player)
+            if len(cells) == 0:
+                return Move(), "🤖 AI is thinking..."
+            best = int(scores.argmax())
+            idx = int(cells[best])
+            return Move(idx // self.size, idx % self.size, int(scores[best])), "🤖 AI is thinking..."
+        
+        best_score = float('-inf')
+        best_move = Move()
+        
+        for i, j in self.candidate_moves():
+            score = self.score_move(i, j, ai_player, human_player) + self.get_positional_bonus(i, j)
+            
+            if score > best_score:
+                best_score = score
+                best_move = Move(i, j, score)
+        
+        return best_move, "🤖 AI is thinking..."
+    
+    def search_ai_move(self, ai_player, human_player, max_depth, time_budget=None, table=None, bee_chance=0.0,
+                       cancel=None, stats=None):
+        """Alpha-beta search for the AI move, trying fork moves first.
+        
+        With a bee_chance the search also weighs the bees taking the AI's
+        turn after each human move (see ExpectimaxSearch). Setting the
+        ``cancel`` event stops the search as if its time budget ran out.
+        """
+        if bee_chance > 0:
+            search = ExpectimaxSearch(self, max_depth, time_budget, table, human_player, bee_chance, cancel)
+        else:
+            search = AlphaBetaSearch(self, max_depth, time_budget, table, cancel)
+        fork_cells = [(m.row, m.col) for m in self.find_fork_moves(ai_player)]
+        opp_fork_cells = [(m.row, m.col) for m in self.find_fork_moves(human_player)]
+        
+        root_moves = search.order_moves(ai_player, human_player)
+        priority = list(dict.fromkeys(fork_cells + opp_fork_cells))
+        root_moves = priority + [move for move in root_moves if move not in priority]
+        best_move = search.run(ai_player, human_player, root_moves)
+        
+        cell = (best_move.row, best_move.col)
+        if stats is not None:
+            stats.nodes = search.nodes
+            stats.depth = search.depth_reached
+            stats.branch = 'fork' if cell in fork_cells else 'fork-block' if cell in opp_fork_cells else 'search'
+        if cell in fork_cells:
+            return best_move, "🔱 AI creating a fork!"
+        if cell in opp_fork_cells:
+            return best_move, "🚫 AI blocking your fork!"
+        return best_move, "🤖 AI is thinking..."
+    
+    def board_array(self):
+        """The board as a flat int8 array of PIECE_CODES, row-major"""
+        return np.array([PIECE_CODES[cell] for row in self.board for cell in row], dtype=np.int8)
+    
+    def position_key(self, side_to_move):
+        """Zobrist hash of the position with side_to_move to play"""
+        key = self.zobrist_hashes[0]
+        return key ^ self.geometry.zobrist_side if side_to_move == BUTTERFLY else key
+    
+    def canonical_key(self, side_to_move):
+        """Symmetry-invariant Zobrist hash and the index of the symmetry it was taken under"""
+        key = min(self.zobrist_hashes)
+        transform = self.zobrist_hashes.index(key)
+        return (key ^ self.geometry.zobrist_side if side_to_move == BUTTERFLY else key), transform
+    
+    def canonical_position(self):
+        """Canonical form of the position under the board's 8 symmetries.
+        
+        Returns ``(cells, transform)``: ``cells`` is the row-major cell string of
+        the lexicographically smallest symmetric image and ``transform`` the
+        index of the symmetry producing it. Moves are mapped between the two
+        with to_canonical_cell / from_canonical_cell.
+        """
+        flat = ''.join(''.join(row) for row in self.board)
+        return min((''.join(gather(flat)), transform)
+                   for transform, gather in enumerate(self.geometry.symmetry_gathers))
+    
+    def completes_line(self, row, col, player):
+        """Whether player taking the empty cell (row, col) wins"""
+        return row * self.size + col in self.win_cells[player]
+    
+    def bee_chance(self):
+        return BEE_CHANCE.get(self.difficulty, DEFAULT_BEE_CHANCE)
+    
+    def should_bee_interrupt(self, rng=random):
+        if self.move_count <= BEE_MIN_MOVES:
+            return False
+        
+        return rng.random() < self.bee_chance()
+    
+    def get_strategic_bee_move(self, target_player):
+        cells = self.win_cells[target_player]
+        if cells:
+            idx = min(cells)
+            return Move(idx // self.size, idx % self.size, 10000)
+        
+        # Nothing to block: the bees settle on the first free cell
+        return self.first_empty_cell()
+    
+    def first_empty_cell(self):
+        for i in range(self.size):
+            for j in range(self.size):
+                if self.board[i][j] == EMPTY:
+                    return Move(i, j)
+        return Move()
+    
+    def check_win(self, player):
+        return bool(self.open_lines[player][self.win_length])
+    
+    def is_board_full(self):
+        return all(self.board[i][j] != EMPTY for i in range(self.size) for j in range(self.size))
+    
+    def count_pieces(self, piece):
+        return sum(1 for i in range(self.size) for j in range(self.size) if self.board[i][j] == piece)
+
+class BitboardGardenTicTacToe(GardenTicTacToe):
+    """Engine backend keeping one integer bitmask per piece type.
+
+    Bit ``row * size + col`` is set in ``bits[piece]`` when that cell holds
+    ``piece``. Occupancy tests and the first free cell become AND/compare
+    operations and piece counts a popcount, while wins and threats come from
+    the threat index shared with the list backend; ``board`` is still kept in
+    sync as the view the Streamlit rendering loop reads.
+    """
+    
+    __slots__ = ['bits', 'full_mask']
+    
+    def __init__(self, difficulty='Medium', board_size=BOARD_SIZE, win_length=WIN_LENGTH):
+        self.bits = {FLOWER: 0, BUTTERFLY: 0, BEE: 0}
+        self.full_mask = get_geometry(board_size, win_length).full_mask
+        super().__init__(difficulty, board_size, win_length)
+    
+    def _set_cell(self, row, col, piece):
+        bit = 1 << (row * self.size + col)
+        old = self.board[row][col]
+        if old != EMPTY:
+            self.bits[old] &= ~bit
+        if piece != EMPTY:
+            self.bits[piece] |= bit
+        super()._set_cell(row, col, piece)
+    
+    def occupied(self):
+        return self.bits[FLOWER] | self.bits[BUTTERFLY] | self.bits[BEE]
+    
+    def first_empty_cell(self):
+        empty = ~self.occupied() & self.full_mask
+        if not empty:
+            return Move()
+        idx = (empty & -empty).bit_length() - 1
+        return Move(idx // self.size, idx % self.size)
+    
+    def is_board_full(self):
+        return self.occupied() == self.full_mask
+    
+    def count_pieces(self, piece):
+        return popcount(self.bits[piece])
+
+class TranspositionTable:
+    """Fixed-size transposition table with depth-preferred replacement.
+
+    Entries are ``(key, depth, score, flag, move, generation)`` tuples in a
+    preallocated list indexed by ``key % capacity``, so memory stays under
+    ``max_bytes`` however many positions are searched. A slot is overwritten
+    by a deeper (or equal) search of any position, or by anything once its
+    entry is from an earlier search generation. Slot writes are single list
+    assignments, so concurrent sessions can share one table; the counters
+    are advisory under contention.
+    """
+    EXACT, LOWER, UPPER = 0, 1, 2
+    # Approximate size of one stored entry tuple plus its list slot
+    ENTRY_BYTES = 160
+    
+    def __init__(self, max_bytes=TT_MAX_BYTES):
+        self.capacity = max(1, max_bytes // self.ENTRY_BYTES)
+        self.slots = [None] * self.capacity
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.replacements = 0
+    
+    def new_search(self):
+        self.generation += 1
+    
+    def probe(self, key):
+        entry = self.slots[key % self.capacity]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+    
+    def store(self, key, depth, score, flag, move):
+        idx = key % self.capacity
+        old = self.slots[idx]
+        if old is not None:
+            if old[0] != key and old[1] > depth and old[5] == self.generation:
+                return
+            self.replacements += 1
+        self.slots[idx] = (key, depth, score, flag, move, self.generation)
+        self.stores += 1
+    
+    def clear(self):
+        self.slots = [None] * self.capacity
+        self.hits = self.misses = self.stores = self.replacements = 0
+    
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / probes if probes else 0.0,
+            'stores': self.stores,
+            'replacements': self.replacements
+        }
+
+class SearchTimeout(Exception):
+    """Raised inside a search once its wall-clock budget is spent"""
+
+class AlphaBetaSearch:
+    """Negamax alpha-beta search with iterative deepening under a time budget.
+
+    Moves are tried in order of what they gain for the side to move plus what
+    they deny the opponent plus the positional bonus, so wins, blocks and
+    fork-building moves come first. Each completed depth moves its best root
+    move to the front; when the budget runs out mid-iteration the result of
+    the last completed depth is returned. With a ``TranspositionTable``,
+    positions reached through different move orders are searched once and
+    their best move is tried first on later visits. Entries are keyed by the
+    symmetry-invariant ``canonical_key``, so the 8 images of a position share
+    one entry and its best move is stored in the canonical frame.
+    """
+    
+    def __init__(self, game, max_depth, time_budget=None, table=None, cancel=None):
+        self.game = game
+        # threading.Event; once set the search stops at its next node like on a timeout
+        self.cancel = cancel
+        self.table = table
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        # The budget is counted from construction so root move preparation is included
+        self.deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        self.nodes = 0
+        self.depth_reached = 0
+    
+    def order_moves(self, side, other):
+        game = self.game
+        own_score = game.scores[side]
+        opp_score = game.scores[other]
+        scored = []
+        for i, j in game.candidate_moves():
+            gain = game.score_move(i, j, side, other) - own_score
+            denial = game.score_move(i, j, other, side) - opp_score
+            scored.append((gain + denial + game.get_positional_bonus(i, j), i, j))
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return [(i, j) for _, i, j in scored]
+    
+    def run(self, side, other, root_moves=None):
+        game = self.game
+        history_length = len(game.move_history)
+        
+        moves = list(root_moves) if root_moves is not None else self.order_moves(side, other)
+        if not moves:
+            return Move()
+        if self.table is not None:
+            self.table.new_search()
+        best_move = Move(moves[0][0], moves[0][1], 0)
+        
+        for depth in range(1, self.max_depth + 1):
+            try:
+                score, move = self._search_root(side, other, moves, depth)
+            except SearchTimeout:
+                while len(game.move_history) > history_length:
+                    game.undo_move()
+                break
+            best_move = Move(move[0], move[1], score)
+            self.depth_reached = depth
+            moves.remove(move)
+            moves.insert(0, move)
+            if abs(score) >= WIN_SCORE - self.max_depth:
+                break
+        
+        return best_move
+    
+    def _search_root(self, side, other, moves, depth):
+        game = self.game
+        alpha = float('-inf')
+        best_score = float('-inf')
+        best_move = moves[0]
+        for row, col in moves:
+            if game.completes_line(row, col, side):
+                return WIN_SCORE, (row, col)
+            game.make_move(row, col, side)
+            score = self.child_value(side, other, depth, alpha, float('inf'), 0)
+            game.undo_move()
+            if score > best_score:
+                best_score = score
+                best_move = (row, col)
+                alpha = score
+        return best_score, best_move
+    
+    def negamax(self, side, other, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if self.cancel is not None and self.cancel.is_set():
+            raise SearchTimeout()
+        
+        game = self.game
+        if depth == 0:
+            return game.scores[side] - game.scores[other]
+        
+        table = self.table
+        table_move = None
+        if table is not None:
+            key, transform = self.table_key(side)
+            entry = table.probe(key)
+            if entry is not None:
+                _, entry_depth, entry_score, flag, table_move, _ = entry
+                table_move = game.geometry.symmetry_inverses[transform][table_move]
+                if entry_depth >= depth:
+                    entry_score = self._score_from_table(entry_score, ply)
+                    if flag == TranspositionTable.EXACT:
+                        return entry_score
+                    if flag == TranspositionTable.LOWER and entry_score > alpha:
+                        alpha = entry_score
+                    elif flag == TranspositionTable.UPPER and entry_score < beta:
+                        beta = entry_score
+                    if alpha >= beta:
+                        return entry_score
+        
+        moves = self.order_moves(side, other)
+        if not moves:
+            return 0
+        if table_move is not None:
+            cell = divmod(table_move, game.size)
+            if cell in moves:
+                moves.remove(cell)
+                moves.insert(0, cell)
+        
+        original_alpha = alpha
+        best_score = float('-inf')
+        best_move = moves[0]
+        for row, col in moves:
+            if game.completes_line(row, col, side):
+                return WIN_SCORE - ply
+            game.make_move(row, col, side)
+            score = self.child_value(side, other, depth, alpha, beta, ply)
+            game.undo_move()
+            if score > best_score:
+                best_score = score
+                best_move = (row, col)
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+        
+        if table is not None:
+            if best_score <= original_alpha:
+                flag = TranspositionTable.UPPER
+            elif best_score >= beta:
+                flag = TranspositionTable.LOWER
+            else:
+                flag = TranspositionTable.EXACT
+            table.store(key, depth, self._score_to_table(best_score, ply), flag,
+                        game.geometry.symmetries[transform][best_move[0] * game.size + best_move[1]])
+        return best_score
+    
+    def child_value(self, side, other, depth, alpha, beta, ply):
+        """Score for side of the position just reached by its move at ply"""
+        return -self.negamax(other, side, depth - 1, -beta, -alpha, ply + 1)
+    
+    def table_key(self, side):
+        return self.game.canonical_key(side)
+    
+    # Win scores are stored relative to the stored node rather than the root,
+    # so a table entry stays correct when reached at a different ply
+    @staticmethod
+    def _score_to_table(score, ply):
+        if score >= WIN_SCORE - 1000:
+            return score + ply
+        if score <= -WIN_SCORE + 1000:
+            return score - ply
+        return score
+    
+    @staticmethod
+    def _score_from_table(score, ply):
+        if score >= WIN_SCORE - 1000:
+            return score - ply
+        if score <= -WIN_SCORE + 1000:
+            return score + ply
+        return score
+
+class ExpectimaxSearch(AlphaBetaSearch):
+    """AlphaBetaSearch that models the bees as chance nodes.
+    
+    After every human move with more than BEE_MIN_MOVES on the board the
+    position is worth ``bee_chance`` times its value after the bees play
+    ``get_strategic_bee_move`` against the AI and the human moves again, plus
+    the rest of the time its value with the AI to move. The two outcomes are
+    searched with Star1 windows, so alpha-beta still cuts off when the first
+    outcome alone settles the bound. Entries go in the shared table under
+    keys salted with the human side and bee chance, keeping them apart from
+    plain alpha-beta values while later turns reuse this search's subtrees.
+    They are keyed by the position as it stands rather than its canonical
+    form: the bees pick cells in row-major order, so the 8 images of a
+    position are worth different amounts here.
+    """
+    
+    def __init__(self, game, max_depth, time_budget=None, table=None, human=FLOWER, bee_chance=DEFAULT_BEE_CHANCE,
+                 cancel=None):
+        super().__init__(game, max_depth, time_budget, table, cancel)
+        self.human = human
+        self.ai = BUTTERFLY if human == FLOWER else FLOWER
+        self.bee_chance = bee_chance
+        self.key_salt = random.Random(f'bees/{human}/{bee_chance}').getrandbits(64)
+    
+    def child_value(self, side, other, depth, alpha, beta, ply):
+        game = self.game
+        if side != self.human or game.move_count <= BEE_MIN_MOVES:
+            return -self.negamax(other, side, depth - 1, -beta, -alpha, ply + 1)
+        
+        p = self.bee_chance
+        q = 1 - p
+        # No bees: the AI replies. Its window leaves room for the bee outcome
+        # to lie anywhere in [-WIN_SCORE, WIN_SCORE]
+        low = max(-WIN_SCORE, (alpha - p * WIN_SCORE) / q)
+        high = min(WIN_SCORE, (beta + p * WIN_SCORE) / q)
+        reply = -self.negamax(other, side, depth - 1, -high, -low, ply + 1)
+        if reply <= low:
+            return q * reply + p * WIN_SCORE
+        if reply >= high:
+            return q * reply - p * WIN_SCORE
+        
+        bee_move = game.get_strategic_bee_move(self.ai)
+        if bee_move.row == -1:
+            return reply
+        low = max(-WIN_SCORE, (alpha - q * reply) / p)
+        high = min(WIN_SCORE, (beta - q * reply) / p)
+        game.make_move(bee_move.row, bee_move.col, BEE)
+        again = self.negamax(side, other, depth - 1, low, high, ply + 1)
+        game.undo_move()
+        return q * reply + p * again
+    
+    def table_key(self, side):
+        return self.game.position_key(side) ^ self.key_salt, 0
+
+ENGINE_BACKENDS = {
+    'list': GardenTicTacToe,
+    'bitboard': BitboardGardenTicTacToe,
+}
+
+def new_game(difficulty='Medium', board_size=BOARD_SIZE, win_length=WIN_LENGTH):
+    """Create a game on the configured engine backend"""
+    return ENGINE_BACKENDS[ENGINE_BACKEND](difficulty, board_size, win_length)
+
+def game_from_bytes(data):
+    """Rebuild a GardenTicTacToe.to_bytes state on the configured engine backend"""
+    return ENGINE_BACKENDS[ENGINE_BACKEND].from_bytes(data)
+
+def pack_moves(moves, board_size=BOARD_SIZE):
+    """(player, row, col) moves as bytes, each the piece code over the cell index.
+    
+    Boards up to 8x8 take one byte per move (code in the top 2 bits), larger
+    ones two (code in the top 2 bits of 16).
+    """
+    if board_size * board_size > 64:
+        if board_size > 128:
+            raise ValueError(f"cannot pack moves on a {board_size}x{board_size} board")
+        return b''.join((PIECE_CODES[player] << 14 | row * board_size + col).to_bytes(2, 'big')
+                        for player, row, col in moves)
+    return bytes(PIECE_CODES[player] << 6 | row * board_size + col for player, row, col in moves)
+
+def unpack_moves(data, board_size=BOARD_SIZE):
+    """Inverse of pack_moves"""
+    if board_size * board_size > 64:
+        values = [int.from_bytes(data[i:i + 2], 'big') for i in range(0, len(data), 2)]
+        shift = 14
+    else:
+        values = data
+        shift = 6
+    mask = (1 << shift) - 1
+    return [(CODE_PIECES[value >> shift], (value & mask) // board_size, (value & mask) % board_size)
+            for value in values]
+
+def replay_moves(moves, ply=None, difficulty='Medium', board_size=BOARD_SIZE, win_length=WIN_LENGTH):
+    """The game after its first ply moves (all of them by default), each bee counted as an interruption"""
+    game = new_game(difficulty, board_size, win_length)
+    for player, row, col in moves[:ply]:
+        game.make_move(row, col, player)
+        if player == BEE:
+            game.bee_interruptions += 1
+    return game
+
+# Vectorized evaluation
+def score_candidates_scalar(game, player, opponent):
+    """Reference scores of every candidate move: score_move plus the positional bonus"""
+    cells = game.candidate_cells()
+    size = game.size
+    return cells, [game.score_move(idx // size, idx % size, player, opponent) + game.geometry.positional_bonus[idx]
+                   for idx in cells]
+
+def score_candidates_vectorized(game, player, opponent):
+    """score_candidates_scalar computed for all candidates in one NumPy pass.
+    
+    Per-line piece counts come from gathering the int8 board through the line
+    index matrix; each line's gain from one more player piece is looked up in
+    the score table and summed per cell through the incidence matrix.
+    Returns ``(cells, scores)`` as arrays, cells in row-major order.
+    """
+    line_index, incidence, positional, score_table = game.geometry.array_tables()
+    line_cells = game.board_array()[line_index]
+    player_counts = (line_cells == PIECE_CODES[player]).sum(axis=1)
+    opp_counts = (line_cells == PIECE_CODES[opponent]).sum(axis=1)
+    bee_counts = (line_cells == PIECE_CODES[BEE]).sum(axis=1)
+    current = score_table[player_counts, opp_counts, bee_counts]
+    gains = score_table[player_counts + 1, opp_counts, bee_counts] - current
+    cells = np.array(game.candidate_cells(), dtype=np.intp)
+    scores = current.sum() + incidence[cells] @ gains + positional[cells]
+    return cells, scores
+
+def best_moves_batch(boards, sides, board_size=BOARD_SIZE, win_length=WIN_LENGTH, chunk_size=BATCH_CHUNK_SIZE):
+    """Greedy best move and its score for many positions at once.
+    
+    ``boards`` is an N x board_size**2 array of PIECE_CODES, row-major, and
+    ``sides`` the PIECE_CODES of the side to move, either one value for all
+    boards or one per board. Each board is scored as get_ai_move's greedy
+    scan would score it (candidate cells, evaluate_board after the move plus
+    the positional bonus, first best cell in row-major order). Returns
+    ``(moves, scores)`` arrays of length N; the move is the cell index, or
+    -1 with score 0 for a full board. Boards are processed ``chunk_size`` at a
+    time so memory stays bounded for any N.
+    """
+    geometry = get_geometry(board_size, win_length)
+    if np is None:
+        return _best_moves_batch_scalar(boards, sides, board_size, win_length)
+    
+    boards = np.asarray(boards, dtype=np.int8).reshape(-1, geometry.num_cells)
+    sides = np.broadcast_to(np.asarray(sides, dtype=np.int8), (len(boards),))
+    line_index, incidence, positional, score_table = geometry.array_tables()
+    neighbours = geometry.neighbour_matrix()
+    incidence_t = incidence.T
+    
+    moves = np.full(len(boards), -1, dtype=np.intp)
+    scores = np.zeros(len(boards), dtype=np.int64)
+    for start in range(0, len(boards), chunk_size):
+        chunk = boards[start:start + chunk_size]
+        own = sides[start:start + chunk_size, None, None]
+        # Flowers and Butterflies are codes 1 and 2, so 3 - own is the opponent
+        line_cells = chunk[:, line_index]
+        player_counts = (line_cells == own).sum(axis=2)
+        opp_counts = (line_cells == 3 - own).sum(axis=2)
+        bee_counts = (line_cells == PIECE_CODES[BEE]).sum(axis=2)
+        current = score_table[player_counts, opp_counts, bee_counts]
+        gains = score_table[player_counts + 1, opp_counts, bee_counts] - current
+        cell_scores = current.sum(axis=1)[:, None] + gains @ incidence_t + positional
+        
+        empty = chunk == PIECE_CODES[EMPTY]
+        occupied = ~empty
+        near = (occupied.astype(np.int32) @ neighbours) > 0
+        candidates = empty & (near | ~occupied.any(axis=1)[:, None])
+        cell_scores = np.where(candidates, cell_scores, np.iinfo(np.int64).min)
+        
+        best = cell_scores.argmax(axis=1)
+        playable = candidates.any(axis=1)
+        rows = np.arange(len(chunk))
+        moves[start:start + len(chunk)] = np.where(playable, best, -1)
+        scores[start:start + len(chunk)] = np.where(playable, cell_scores[rows, best], 0)
+    return moves, scores
+
+def _best_moves_batch_scalar(boards, sides, board_size, win_length):
+    boards = [list(board) for board in boards]
+    if isinstance(sides, int):
+        sides = [sides] * len(boards)
+    moves, scores = [], []
+    for board, side in zip(boards, sides):
+        game = new_game('Easy', board_size, win_length)
+        for idx, code in enumerate(board):
+            if code != PIECE_CODES[EMPTY]:
+                game._set_cell(idx // board_size, idx % board_size, CODE_PIECES[code])
+        player = CODE_PIECES[side]
+        cells, cell_scores = score_candidates_scalar(game, player, BUTTERFLY if player == FLOWER else FLOWER)
+        if cells:
+            best = cell_scores.index(max(cell_scores))
+            moves.append(cells[best])
+            scores.append(cell_scores[best])
+        else:
+            moves.append(-1)
+            scores.append(0)
+    return moves, scores
@@ -0,0 +1,213 @@
+"""Headless self-play simulator for tuning the Garden Tic-Tac-Toe economy.
+
+Plays many games following the app's turn rules (the human moves first; after
+each human move the bees may interrupt instead of the AI replying) with a
+scripted or engine "human", settles each one with the app's auction maths and
+aggregates the results per difficulty and player bid:
+
+    python garden_simulator.py --games 100000 --difficulty Easy Medium --bid 10 50 250
+
+Games are split into batches run on a process pool. Each batch draws every
+random decision (human moves, bids, bee interruptions) from its own
+``random.Random`` seeded by ``--seed`` and the batch's identity, so a run is
+reproducible whatever the number of workers or the order batches finish in;
+only searches cut short by their time budget can differ between runs.
+Running totals are appended to ``--output`` as JSON lines as batches
+complete; the last line for a (difficulty, bid) pair holds its totals so far.
+"""
+import argparse
+import json
+import random
+import time
+from multiprocessing import Pool, cpu_count
+
+from garden_engine import FLOWER, BUTTERFLY, BEE, TranspositionTable, new_game
+from garden_auction import (
+    MIN_BET, MAX_BET, calculate_ai_bid, calculate_bee_bid, calculate_auction_payout, game_outcome
+)
+from garden_book import load_opening_book
+
+SIMULATION_OUTPUT_PATH = 'garden_simulation.jsonl'
+# Smaller than the app's table: one per worker, cleared for every batch
+SIMULATION_TT_BYTES = 4 * 1024 * 1024
+OUTCOMES = ('Flowers', 'Butterflies', 'Bees', 'Draw')
+
+def random_policy(game, human, ai, rng, table=None):
+    """Any empty cell"""
+    cells = [(i, j) for i in range(game.size) for j in range(game.size) if game.is_valid_move(i, j)]
+    return rng.choice(cells)
+
+def greedy_policy(game, human, ai, rng, table=None):
+    """Win if possible, else block, else any empty cell"""
+    for player in (human, ai):
+        move = game.find_immediate_win(player)
+        if move.row != -1:
+            return move.row, move.col
+    return random_policy(game, human, ai, rng, table)
+
+def engine_policy(game, human, ai, rng, table=None):
+    """The engine at the game's difficulty, playing the human's side"""
+    move, _ = game.get_ai_move(human, ai, table=table, book=load_opening_book())
+    return move.row, move.col
+
+HUMAN_POLICIES = {
+    'random': random_policy,
+    'greedy': greedy_policy,
+    'engine': engine_policy
+}
+
+_worker_table = None
+
+def _init_worker():
+    global _worker_table
+    _worker_table = TranspositionTable(SIMULATION_TT_BYTES)
+
+def play_game(difficulty, player_bid, policy, rng, human=FLOWER, table=None):
+    """Play one game as the app would and return its settled result"""
+    ai = BUTTERFLY if human == FLOWER else FLOWER
+    ai_bid = calculate_ai_bid(difficulty, player_bid, rng)
+    bee_bid = calculate_bee_bid(rng)
+    game = new_game(difficulty)
+    book = load_opening_book()
+    
+    winner = None
+    while winner is None:
+        row, col = policy(game, human, ai, rng, table)
+        game.make_move(row, col, human)
+        winner = game_outcome(game)
+        if winner is not None:
+            break
+        
+        if game.should_bee_interrupt(rng):
+            bee_move = game.get_strategic_bee_move(ai)
+            if bee_move.row != -1:
+                game.make_move(bee_move.row, bee_move.col, BEE)
+                game.bee_interruptions += 1
+        else:
+            ai_move, _ = game.get_ai_move(ai, human, table=table, book=book)
+            if ai_move.row != -1:
+                game.make_move(ai_move.row, ai_move.col, ai)
+        winner = game_outcome(game)
+    
+    payout, pot = calculate_auction_payout(winner, player_bid, ai_bid, bee_bid, game.bee_interruptions)
+    return {
+        'winner': winner,
+        'moves': game.move_count,
+        'bees': game.bee_interruptions,
+        'ai_bid': ai_bid,
+        'bee_bid': bee_bid,
+        'net': payout - player_bid
+    }
+
+def new_totals():
+    return {
+        'games': 0,
+        'wins': dict.fromkeys(OUTCOMES, 0),
+        'moves': 0,
+        'bees': 0,
+        'ai_bid': 0,
+        'bee_bid': 0,
+        'net': 0
+    }
+
+def add_totals(totals, other):
+    totals['games'] += other['games']
+    for outcome in OUTCOMES:
+        totals['wins'][outcome] += other['wins'][outcome]
+    for field in ('moves', 'bees', 'ai_bid', 'bee_bid', 'net'):
+        totals[field] += other[field]
+
+def summarize(totals):
+    """Rates and means of a totals record"""
+    games = totals['games'] or 1
+    return {
+        'games': totals['games'],
+        'win_rates': {outcome: count / games for outcome, count in totals['wins'].items()},
+        'bee_victory_rate': totals['wins']['Bees'] / games,
+        'mean_moves': totals['moves'] / games,
+        'mean_bee_interruptions': totals['bees'] / games,
+        'mean_ai_bid': totals['ai_bid'] / games,
+        'mean_bee_bid': totals['bee_bid'] / games,
+        'expected_net_coins': totals['net'] / games
+    }
+
+def run_batch(task):
+    """Worker entry point: play one batch of games and return its totals"""
+    difficulty, player_bid, policy_name, human, games, seed, index = task
+    rng = random.Random(f'{seed}/{difficulty}/{player_bid}/{policy_name}/{human}/{index}')
+    if _worker_table is None:
+        _init_worker()
+    _worker_table.clear()
+    
+    policy = HUMAN_POLICIES[policy_name]
+    totals = new_totals()
+    for _ in range(games):
+        result = play_game(difficulty, player_bid, policy, rng, human, _worker_table)
+        totals['games'] += 1
+        totals['wins'][result['winner']] += 1
+        for field in ('moves', 'bees', 'ai_bid', 'bee_bid', 'net'):
+            totals[field] += result[field]
+    return difficulty, player_bid, totals
+
+def simulate(difficulties, bids, games, policy='greedy', human=FLOWER, workers=None,
+             batch_size=200, seed=0, output=SIMULATION_OUTPUT_PATH, progress=None):
+    """Play ``games`` games per (difficulty, bid) on a process pool.
+    
+    Returns the totals per (difficulty, bid); with ``output`` each finished
+    batch appends the updated running summary of its pair as one JSON line.
+    """
+    tasks = []
+    for difficulty in difficulties:
+        for player_bid in bids:
+            for index, start in enumerate(range(0, games, batch_size)):
+                tasks.append((difficulty, player_bid, policy, human,
+                              min(batch_size, games - start), seed, index))
+    
+    results = {(difficulty, player_bid): new_totals() for difficulty in difficulties for player_bid in bids}
+    out = open(output, 'a') if output else None
+    try:
+        with Pool(workers or cpu_count(), initializer=_init_worker) as pool:
+            for done, (difficulty, player_bid, totals) in enumerate(pool.imap_unordered(run_batch, tasks), 1):
+                add_totals(results[difficulty, player_bid], totals)
+                if out:
+                    record = {'difficulty': difficulty, 'bid': player_bid, 'policy': policy, 'human': human,
+                              'seed': seed, **summarize(results[difficulty, player_bid])}
+                    out.write(json.dumps(record) + '\n')
+                    out.flush()
+                if progress:
+                    progress(done, len(tasks))
+    finally:
+        if out:
+            out.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate Garden Tic-Tac-Toe games headless")
+    parser.add_argument('--games', type=int, default=1000, help="games per difficulty and bid")
+    parser.add_argument('--difficulty', nargs='+', default=['Easy', 'Medium', 'Hard'],
+                        choices=['Easy', 'Medium', 'Hard'], help="AI difficulties to play")
+    parser.add_argument('--bid', nargs='+', type=int, default=[MIN_BET, 50, 100, 250, MAX_BET],
+                        help="player bids to play at")
+    parser.add_argument('--policy', default='greedy', choices=sorted(HUMAN_POLICIES), help="how the human plays")
+    parser.add_argument('--human', default=FLOWER, choices=[FLOWER, BUTTERFLY], help="the human's piece")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--batch-size', type=int, default=200, help="games per worker task")
+    parser.add_argument('--seed', type=int, default=0, help="base seed for every random decision")
+    parser.add_argument('--output', default=SIMULATION_OUTPUT_PATH, help="JSON lines file to append running results to")
+    args = parser.parse_args()
+    
+    started = time.time()
+    results = simulate(args.difficulty, args.bid, args.games, args.policy, args.human, args.workers,
+                       args.batch_size, args.seed, args.output,
+                       progress=lambda done, total: print(f"\r{done}/{total} batches", end='', flush=True))
+    print(f"\nPlayed {sum(t['games'] for t in results.values())} games in {time.time() - started:.0f}s")
+    print(f"{'difficulty':<10} {'bid':>5} {'flowers':>8} {'butterflies':>11} {'bees':>7} {'draw':>7} {'moves':>6} {'net':>8}")
+    for (difficulty, player_bid), totals in results.items():
+        summary = summarize(totals)
+        rates = summary['win_rates']
+        print(f"{difficulty:<10} {player_bid:>5} {rates['Flowers']:>8.1%} {rates['Butterflies']:>11.1%} "
+              f"{rates['Bees']:>7.1%} {rates['Draw']:>7.1%} {summary['mean_moves']:>6.1f} "
+              f"{summary['expected_net_coins']:>8.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1386 @@
+"""Persistence for Garden Tic-Tac-Toe: wallets, game results and statistics.
+
+The module functions go through a storage backend picked by STORAGE_BACKEND
+(or switched with use_storage): SQLite, the default and the only one shared
+between processes; an in-memory one for benchmarks and load tests; and an
+append-only log replayed into memory when opened. Nothing is opened at
+import.
+
+Each user has a wallet. A bid is taken out of the balance by reserve_bet
+when the game starts and held under the game's key. Finished games are
+settled by settle_game: the payout, the release of the reservation and the
+result rows commit in one transaction, either immediately or, with
+write-behind, batched with other sessions' games by a background
+ResultWriter. Each game's moves are kept packed, so any saved position can
+be replayed.
+"""
+import atexit
+import bisect
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from garden_engine import BOARD_SIZE, WIN_LENGTH, pack_moves, unpack_moves, replay_moves
+from garden_auction import STARTING_COINS
+
+# Backend every storage function uses, a STORAGE_BACKENDS key; use_storage switches it at runtime
+STORAGE_BACKEND = 'sqlite'
+DATABASE_PATH = 'garden_tictactoe.db'
+LOG_PATH = 'garden_tictactoe.log'
+# fsync the log after every change, surviving power loss rather than only process crashes
+LOG_FSYNC = False
+# Wallet used when no user is given; databases from before per-user wallets
+# have their single wallet moved here
+DEFAULT_USER = 'default'
+# Seconds a bid may stay reserved without its game settling; older
+# reservations are from abandoned games and go back to the balance
+RESERVATION_TIMEOUT = 2 * 3600
+# Queue finished games for a background writer instead of committing them on
+# the caller's thread. Off by default: with it on, the wallet read right after
+# a game can lag until the batch commits.
+WRITE_BEHIND = False
+WRITE_BEHIND_BATCH = 100
+# Seconds the writer waits to fill a batch once it holds a result
+WRITE_BEHIND_INTERVAL = 0.5
+WRITE_ATTEMPTS = 3
+# Connection pool bounds: open connections, seconds a checkout may wait and
+# seconds a connection may sit idle before it is closed
+POOL_SIZE = 8
+POOL_TIMEOUT = 10.0
+POOL_IDLE_TIMEOUT = 300.0
+# Prepared statements each connection keeps compiled
+STATEMENT_CACHE_SIZE = 256
+
+# stats_rollup keys per scope and the per-game term summed into each column,
+# as SQL over a game_stats row prefixed by {row}
+ROLLUP_SCOPES = {
+    'all': "''",
+    'difficulty': '{row}difficulty',
+    'day': 'date({row}timestamp)'
+}
+ROLLUP_COLUMNS = (
+    ('games', '1'),
+    ('flower_wins', "{row}winner = 'Flowers'"),
+    ('butterfly_wins', "{row}winner = 'Butterflies'"),
+    ('bee_wins', "{row}winner = 'Bees'"),
+    ('draws', "{row}winner = 'Draw'"),
+    ('total_moves', '{row}total_moves'),
+    ('total_bees', '{row}bee_interruptions'),
+    ('total_player_bid', '{row}player_bid'),
+    ('total_ai_bid', '{row}ai_bid'),
+    ('total_payout', '{row}payout_amount')
+)
+
+# Winners in the order load_history counts them
+OUTCOMES = ('Flowers', 'Butterflies', 'Bees', 'Draw')
+# Time buckets of load_history as strftime formats over the UTC timestamp
+HISTORY_BUCKETS = {
+    'hour': '%Y-%m-%d %H:00',
+    'day': '%Y-%m-%d'
+}
+RECENT_GAMES_PAGE = 20
+# Fields of a load_recent_games row
+GAME_COLUMNS = ('id', 'timestamp', 'winner', 'difficulty', 'total_moves', 'bee_interruptions', 'player_bid', 'ai_bid',
+                'bee_bid', 'payout')
+
+logger = logging.getLogger(__name__)
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection frees up within POOL_TIMEOUT"""
+
+# Thread-safe bounded database connection pool
+class DatabasePool:
+    """Pool of at most POOL_SIZE connections to one SQLite file, one pool per path in a process.
+    
+    Connections are opened on demand, set up once with the PRAGMAs and
+    handed out most-recently-used first, so the statement cache of a warm
+    connection keeps being hit; ones idle for longer than POOL_IDLE_TIMEOUT
+    are closed. A checkout blocks for up to POOL_TIMEOUT while all are in
+    use, then raises PoolTimeout. close() (registered with atexit) closes
+    the pooled connections and retires the pool: DatabasePool(path) then
+    opens a fresh one, and a checkout from the retired pool, such as the
+    write-behind flush at exit, gets a connection closed on return.
+    """
+    _instances = {}
+    _lock = threading.Lock()
+    
+    def __new__(cls, path=None):
+        path = path or DATABASE_PATH
+        instance = cls._instances.get(path)
+        if instance is None:
+            with cls._lock:
+                instance = cls._instances.get(path)
+                if instance is None:
+                    instance = super().__new__(cls)
+                    instance._init_pool(path)
+                    cls._instances[path] = instance
+                    atexit.register(instance.close)
+        return instance
+    
+    def _init_pool(self, path):
+        self.path = path
+        self.schema_ready = False
+        self.available = threading.Condition(threading.Lock())
+        # (connection, time it was returned), most recently returned last
+        self.idle = []
+        self.open = 0
+        self.closed = False
+        self.stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'wait_time': 0.0,
+            'max_wait': 0.0,
+            'created': 0,
+            'evicted': 0
+        }
+    
+    @contextmanager
+    def get_connection(self):
+        """Check out a connection; committed on success, rolled back on error, returned either way"""
+        conn = self._checkout()
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self._checkin(conn)
+    
+    def _checkout(self):
+        started = time.monotonic()
+        deadline = started + POOL_TIMEOUT
+        with self.available:
+            waited = False
+            while True:
+                self._evict_idle()
+                if self.idle:
+                    conn = self.idle.pop()[0]
+                    break
+                if self.open < POOL_SIZE or self.closed:
+                    self.open += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout(f"no database connection free after {POOL_TIMEOUT}s")
+                waited = True
+                self.available.wait(remaining)
+            wait = time.monotonic() - started
+            self.stats['checkouts'] += 1
+            self.stats['waits'] += waited
+            self.stats['wait_time'] += wait
+            self.stats['max_wait'] = max(self.stats['max_wait'], wait)
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self.available:
+                    self.open -= 1
+                    self.available.notify()
+                raise
+        return conn
+    
+    def _checkin(self, conn):
+        with self.available:
+            if self.closed:
+                self.open -= 1
+                conn.close()
+            else:
+                self.idle.append((conn, time.monotonic()))
+            self.available.notify()
+    
+    def _evict_idle(self):
+        """Close idle connections unused for POOL_IDLE_TIMEOUT; the caller holds the lock"""
+        cutoff = time.monotonic() - POOL_IDLE_TIMEOUT
+        # Oldest first, so the stale ones are a prefix
+        while self.idle and self.idle[0][1] < cutoff:
+            self.idle.pop(0)[0].close()
+            self.open -= 1
+            self.stats['evicted'] += 1
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.path, 
+                               check_same_thread=False,
+                               timeout=30.0,
+                               isolation_level='DEFERRED',
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA cache_size=10000')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        with self.available:
+            self.stats['created'] += 1
+        # Tables are created by the pool's first connection, not at import
+        if not self.schema_ready:
+            with self._lock:
+                if not self.schema_ready:
+                    _create_schema(conn)
+                    self.schema_ready = True
+        return conn
+    
+    def metrics(self):
+        """Pool counters: connections open, in use and idle, checkouts, waits and wait times in seconds"""
+        with self.available:
+            checkouts = self.stats['checkouts']
+            return {
+                'open': self.open,
+                'in_use': self.open - len(self.idle),
+                'idle': len(self.idle),
+                'mean_wait': self.stats['wait_time'] / checkouts if checkouts else 0.0,
+                **self.stats
+            }
+    
+    def close(self):
+        """Close every idle connection; connections in use are closed when returned"""
+        with DatabasePool._lock:
+            if DatabasePool._instances.get(self.path) is self:
+                del DatabasePool._instances[self.path]
+        with self.available:
+            self.closed = True
+            for conn, _ in self.idle:
+                conn.close()
+            self.open -= len(self.idle)
+            self.idle.clear()
+            self.available.notify_all()
+
+# Database functions
+def _create_schema(conn):
+    """Create the auction betting tables and the rollups if missing, migrating older databases"""
+    c = conn.cursor()
+    # One writer at a time, so concurrent first connections cannot both migrate
+    c.execute('BEGIN IMMEDIATE')
+    c.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    tables = {row[0] for row in c.fetchall()}
+    new_rollups = 'stats_rollup' not in tables
+    
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS game_stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            winner TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            total_moves INTEGER NOT NULL,
+            bee_interruptions INTEGER NOT NULL,
+            player_bid INTEGER DEFAULT 0,
+            ai_bid INTEGER DEFAULT 0,
+            bee_bid INTEGER DEFAULT 0,
+            payout_amount INTEGER DEFAULT 0,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Balances never go negative; reserved holds the bids of games in progress
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS wallets (
+            user_id TEXT PRIMARY KEY,
+            coins INTEGER NOT NULL CHECK (coins >= 0),
+            reserved INTEGER NOT NULL DEFAULT 0 CHECK (reserved >= 0),
+            total_wagered INTEGER DEFAULT 0,
+            total_won INTEGER DEFAULT 0,
+            games_played INTEGER DEFAULT 0
+        )
+    ''')
+    if 'player_wallet' in tables:
+        c.execute('''
+            INSERT OR IGNORE INTO wallets (user_id, coins, total_wagered, total_won, games_played)
+            SELECT ?, MAX(coins, 0), total_wagered, total_won, games_played FROM player_wallet WHERE id = 1
+        ''', (DEFAULT_USER,))
+        c.execute('DROP TABLE player_wallet')
+    
+    # The bid of each game in progress, summed into its wallet's reserved
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS reservations (
+            game_key TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            amount INTEGER NOT NULL CHECK (amount > 0),
+            reserved_at DATETIME NOT NULL
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_reservations_user ON reservations (user_id, reserved_at)')
+    if 'reservations' not in tables:
+        # Bids reserved before reservations were kept belong to no game: hand them back
+        c.execute('UPDATE wallets SET coins = coins + reserved, reserved = 0 WHERE reserved > 0')
+    
+    # One row of AI search totals per game, written with its game_stats row
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS search_stats (
+            game_id INTEGER PRIMARY KEY REFERENCES game_stats(id),
+            ai_moves INTEGER NOT NULL,
+            total_time REAL NOT NULL,
+            max_time REAL NOT NULL,
+            total_nodes INTEGER NOT NULL,
+            max_depth INTEGER NOT NULL,
+            tt_hits INTEGER NOT NULL,
+            branches TEXT NOT NULL
+        )
+    ''')
+    
+    # Each game's moves packed one byte per move by pack_moves, replayable with replay_moves
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS game_moves (
+            game_id INTEGER PRIMARY KEY REFERENCES game_stats(id),
+            board_size INTEGER NOT NULL,
+            win_length INTEGER NOT NULL,
+            moves BLOB NOT NULL
+        )
+    ''')
+    if 'game_moves' in tables:
+        c.execute('PRAGMA table_info(game_moves)')
+        if 'win_length' not in {row[1] for row in c.fetchall()}:
+            # Games stored before win lengths were kept are taken to be on the default rules
+            c.execute(f'ALTER TABLE game_moves ADD COLUMN win_length INTEGER NOT NULL DEFAULT {WIN_LENGTH}')
+    
+    # History queries: windows scan the timestamp index, which also covers
+    # bucketed win counts; filtered pages walk (difficulty|winner, rowid)
+    c.execute('CREATE INDEX IF NOT EXISTS idx_game_stats_time ON game_stats (timestamp, difficulty, winner)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_game_stats_difficulty ON game_stats (difficulty)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_game_stats_winner ON game_stats (winner)')
+    
+    # Running totals of game_stats per ROLLUP_SCOPES entry, kept by a trigger
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS stats_rollup (
+            scope TEXT NOT NULL,
+            key TEXT NOT NULL,
+            games INTEGER NOT NULL,
+            flower_wins INTEGER NOT NULL,
+            butterfly_wins INTEGER NOT NULL,
+            bee_wins INTEGER NOT NULL,
+            draws INTEGER NOT NULL,
+            total_moves INTEGER NOT NULL,
+            total_bees INTEGER NOT NULL,
+            total_player_bid INTEGER NOT NULL,
+            total_ai_bid INTEGER NOT NULL,
+            total_payout INTEGER NOT NULL,
+            PRIMARY KEY (scope, key)
+        ) WITHOUT ROWID
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS game_stats_rollup AFTER INSERT ON game_stats
+        BEGIN
+            {"".join(_rollup_upsert(scope, key) for scope, key in ROLLUP_SCOPES.items())}
+        END
+    ''')
+    
+    # Search totals per difficulty, kept by a trigger on search_stats
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS search_rollup (
+            difficulty TEXT PRIMARY KEY,
+            games INTEGER NOT NULL,
+            ai_moves INTEGER NOT NULL,
+            total_time REAL NOT NULL,
+            max_time REAL NOT NULL,
+            total_nodes INTEGER NOT NULL,
+            max_depth INTEGER NOT NULL,
+            tt_hits INTEGER NOT NULL
+        )
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS search_stats_rollup AFTER INSERT ON search_stats
+        BEGIN
+            INSERT INTO search_rollup (difficulty, games, ai_moves, total_time, max_time, total_nodes,
+                                       max_depth, tt_hits)
+            VALUES ((SELECT difficulty FROM game_stats WHERE id = NEW.game_id), 1, NEW.ai_moves,
+                    NEW.total_time, NEW.max_time, NEW.total_nodes, NEW.max_depth, NEW.tt_hits)
+            ON CONFLICT (difficulty) DO UPDATE SET
+                games = games + 1,
+                ai_moves = ai_moves + excluded.ai_moves,
+                total_time = total_time + excluded.total_time,
+                max_time = MAX(max_time, excluded.max_time),
+                total_nodes = total_nodes + excluded.total_nodes,
+                max_depth = MAX(max_depth, excluded.max_depth),
+                tt_hits = tt_hits + excluded.tt_hits;
+        END
+    ''')
+    
+    # Databases from before the rollups get them filled from the existing rows
+    if new_rollups:
+        for scope, key in ROLLUP_SCOPES.items():
+            totals = ', '.join(f"SUM({term.format(row='')})" for _, term in ROLLUP_COLUMNS)
+            c.execute(f'''
+                INSERT INTO stats_rollup
+                SELECT '{scope}', {key.format(row='')}, {totals} FROM game_stats GROUP BY 2
+            ''')
+        c.execute('''
+            INSERT INTO search_rollup
+            SELECT g.difficulty, COUNT(*), SUM(s.ai_moves), SUM(s.total_time), MAX(s.max_time),
+                   SUM(s.total_nodes), MAX(s.max_depth), SUM(s.tt_hits)
+            FROM search_stats s JOIN game_stats g ON g.id = s.game_id
+            GROUP BY g.difficulty
+        ''')
+    
+    conn.commit()
+
+def _rollup_upsert(scope, key):
+    """Trigger statement adding the NEW game_stats row to its stats_rollup row for scope"""
+    values = ', '.join(term.format(row='NEW.') for _, term in ROLLUP_COLUMNS)
+    updates = ', '.join(f'{column} = {column} + excluded.{column}' for column, _ in ROLLUP_COLUMNS)
+    return f"""
+            INSERT INTO stats_rollup VALUES ('{scope}', {key.format(row='NEW.')}, {values})
+            ON CONFLICT (scope, key) DO UPDATE SET {updates};"""
+
+
+def _ensure_wallet(c, user):
+    c.execute('INSERT OR IGNORE INTO wallets (user_id, coins) VALUES (?, ?)', (user, STARTING_COINS))
+
+def _insert_game_result(c, result):
+    c.execute('''
+        INSERT INTO game_stats (winner, difficulty, total_moves, bee_interruptions, 
+                               player_bid, ai_bid, bee_bid, payout_amount, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (result['winner'], result['difficulty'], result['total_moves'], result['bee_interruptions'],
+          result['player_bid'], result['ai_bid'], result['bee_bid'], result['payout'], _utc_timestamp()))
+    game_id = c.lastrowid
+    c.execute('INSERT INTO game_moves (game_id, board_size, win_length, moves) VALUES (?, ?, ?, ?)',
+              (game_id, result['board_size'], result['win_length'],
+               pack_moves(result['move_history'], result['board_size'])))
+    search_summary = result['search_summary']
+    if search_summary is not None:
+        c.execute('''
+            INSERT INTO search_stats (game_id, ai_moves, total_time, max_time, total_nodes,
+                                      max_depth, tt_hits, branches)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (game_id, search_summary['ai_moves'], search_summary['total_time'],
+              search_summary['max_time'], search_summary['total_nodes'], search_summary['max_depth'],
+              search_summary['tt_hits'], json.dumps(search_summary['branches'])))
+
+def _rollup_statistics(row):
+    games, flower_wins, butterfly_wins, bee_wins, draws, total_moves, total_bees, total_player_bid, total_ai_bid, \
+        total_payout = row
+    return {
+        'games': games,
+        'flower_wins': flower_wins,
+        'butterfly_wins': butterfly_wins,
+        'bee_wins': bee_wins,
+        'draws': draws,
+        'avg_moves': total_moves / games if games else 0,
+        'total_bees': total_bees,
+        'avg_player_bid': total_player_bid / games if games else 0,
+        'avg_ai_bid': total_ai_bid / games if games else 0,
+        'total_payout': total_payout
+    }
+
+def _search_statistics(difficulty, games, ai_moves, total_time, max_time, total_nodes, max_depth, tt_hits):
+    return {
+        'difficulty': difficulty,
+        'games': games,
+        'ai_moves': ai_moves,
+        'avg_time_ms': 1000 * total_time / ai_moves if ai_moves else 0.0,
+        'max_time_ms': 1000 * max_time,
+        'avg_nodes': total_nodes / ai_moves if ai_moves else 0.0,
+        'max_depth': max_depth,
+        'tt_hits': tt_hits
+    }
+
+def _history_filters(hours, difficulty, winner):
+    """WHERE clause and parameters shared by the windowed queries"""
+    clauses = []
+    params = []
+    if hours is not None:
+        clauses.append("timestamp >= datetime('now', ?)")
+        params.append(f'-{hours} hours')
+    if difficulty is not None:
+        clauses.append('difficulty = ?')
+        params.append(difficulty)
+    if winner is not None:
+        clauses.append('winner = ?')
+        params.append(winner)
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+# Storage backends
+class GardenStorage(ABC):
+    """What a storage backend implements; the module functions of the same names call the current one.
+    
+    Results are dicts built by settle_game or save_game_result. Arguments
+    are checked by the module functions before they get here.
+    """
+    name = None
+    
+    def init(self):
+        """Create whatever the backend keeps its data in; otherwise done on first use"""
+    
+    @abstractmethod
+    def get_player_wallet(self, user):
+        """The wallet tuple, after handing back the user's reservations older than RESERVATION_TIMEOUT"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def update_player_wallet(self, coin_change, wagered, won, user):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def reserve_bet(self, amount, user, game):
+        """True if the bid moved from the balance into reserved under game, False if the balance is short"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def reset_wallet(self, user, live_game):
+        """Reset the wallet and drop its reservations other than live_game's"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def save_game_results(self, results):
+        """Record results without touching any wallet, all or none"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def settle_games(self, results):
+        """Release each result's reservation, credit its payout and record it, all or none.
+        
+        A result whose game is None settles its user's oldest reservation of
+        the same bid. ValueError if a bid has no reservation.
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def load_statistics(self):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def load_statistics_by(self, scope, limit):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def load_statistics_since(self, hours, difficulty, winner):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def load_history(self, hours, bucket, difficulty, winner):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def load_recent_games(self, limit, before_id, difficulty, winner):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def load_search_statistics(self):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def load_packed_moves(self, game_id):
+        """(difficulty, board_size, win_length, pack_moves bytes) of a saved game, or None"""
+        raise NotImplementedError
+    
+    def metrics(self):
+        return {'backend': self.name}
+    
+    def close(self):
+        """Release the backend's files or connections"""
+
+class SQLiteStorage(GardenStorage):
+    """Everything in one SQLite file, shared by every process that opens it.
+    
+    Bids are reserved with one conditional UPDATE and the rollups are kept
+    by triggers, so the file stays consistent whichever process writes.
+    """
+    name = 'sqlite'
+    
+    def __init__(self, path=None):
+        self.pool = DatabasePool(path)
+    
+    def init(self):
+        with self.pool.get_connection():
+            pass
+    
+    def get_player_wallet(self, user):
+        with self.pool.get_connection() as conn:
+            c = conn.cursor()
+            stale_before = _reservation_cutoff()
+            c.execute('SELECT 1 FROM reservations WHERE user_id = ? AND reserved_at < ? LIMIT 1', (user, stale_before))
+            if c.fetchone():
+                self._release_reservations(c, user, stale_before)
+            c.execute('''
+                SELECT coins, reserved, total_wagered, total_won, games_played FROM wallets WHERE user_id = ?
+            ''', (user,))
+            result = c.fetchone()
+            if result is None:
+                _ensure_wallet(c, user)
+                conn.commit()
+                result = (STARTING_COINS, 0, 0, 0, 0)
+            return result
+    
+    def update_player_wallet(self, coin_change, wagered, won, user):
+        with self.pool.get_connection() as conn:
+            c = conn.cursor()
+            _ensure_wallet(c, user)
+            c.execute('''
+                UPDATE wallets 
+                SET coins = coins + ?,
+                    total_wagered = total_wagered + ?,
+                    total_won = total_won + ?,
+                    games_played = games_played + 1
+                WHERE user_id = ?
+            ''', (coin_change, wagered, won, user))
+            conn.commit()
+    
+    def reserve_bet(self, amount, user, game):
+        with self.pool.get_connection() as conn:
+            c = conn.cursor()
+            c.execute('BEGIN IMMEDIATE')
+            try:
+                _ensure_wallet(c, user)
+                c.execute('''
+                    UPDATE wallets 
+                    SET coins = coins - ?,
+                        reserved = reserved + ?
+                    WHERE user_id = ? AND coins >= ?
+                ''', (amount, amount, user, amount))
+                reserved = c.rowcount == 1
+                if reserved:
+                    c.execute('INSERT INTO reservations (game_key, user_id, amount, reserved_at) VALUES (?, ?, ?, ?)',
+                              (game, user, amount, _utc_timestamp()))
+                c.execute('COMMIT')
+            except Exception as e:
+                c.execute('ROLLBACK')
+                raise e
+            return reserved
+    
+    def reset_wallet(self, user, live_game):
+        with self.pool.get_connection() as conn:
+            c = conn.cursor()
+            c.execute('BEGIN IMMEDIATE')
+            try:
+                _ensure_wallet(c, user)
+                c.execute('DELETE FROM reservations WHERE user_id = ? AND game_key IS NOT ?', (user, live_game))
+                c.execute('''
+                    UPDATE wallets 
+                    SET coins = ?,
+                        reserved = (SELECT COALESCE(SUM(amount), 0) FROM reservations WHERE user_id = ?),
+                        total_wagered = 0,
+                        total_won = 0,
+                        games_played = 0
+                    WHERE user_id = ?
+                ''', (STARTING_COINS, user, user))
+                c.execute('COMMIT')
+            except Exception as e:
+                c.execute('ROLLBACK')
+                raise e
+    
+    def _release_reservations(self, c, user, stale_before):
+        """Hand the user's reservations from before stale_before back to the balance"""
+        c.execute('BEGIN IMMEDIATE')
+        try:
+            c.execute('SELECT TOTAL(amount) FROM reservations WHERE user_id = ? AND reserved_at < ?',
+                      (user, stale_before))
+            amount = int(c.fetchone()[0])
+            c.execute('UPDATE wallets SET coins = coins + ?, reserved = reserved - ? WHERE user_id = ?',
+                      (amount, amount, user))
+            c.execute('DELETE FROM reservations WHERE user_id = ? AND reserved_at < ?', (user, stale_before))
+            c.execute('COMMIT')
+        except Exception as e:
+            c.execute('ROLLBACK')
+            raise e
+    
+    def save_game_results(self, results):
+        self._write_games(results, settle=False)
+    
+    def settle_games(self, results):
+        self._write_games(results, settle=True)
+    
+    def _write_games(self, results, settle):
+        with self.pool.get_connection() as conn:
+            c = conn.cursor()
+            # Take the write lock up front rather than upgrading mid-transaction
+            c.execute('BEGIN IMMEDIATE')
+            try:
+                for result in results:
+                    if settle:
+                        self._settle_reservation(c, result)
+                        c.execute('''
+                            UPDATE wallets 
+                            SET coins = coins + ?,
+                                reserved = reserved - ?,
+                                total_wagered = total_wagered + ?,
+                                total_won = total_won + ?,
+                                games_played = games_played + 1
+                            WHERE user_id = ?
+                        ''', (result['payout'], result['player_bid'], result['player_bid'], result['payout'],
+                              result['user']))
+                    _insert_game_result(c, result)
+                c.execute('COMMIT')
+            except Exception as e:
+                c.execute('ROLLBACK')
+                raise e
+    
+    @staticmethod
+    def _settle_reservation(c, result):
+        user, bid, game = result['user'], result['player_bid'], result['game']
+        if game is None:
+            c.execute('''
+                SELECT game_key FROM reservations WHERE user_id = ? AND amount = ?
+                ORDER BY reserved_at, rowid LIMIT 1
+            ''', (user, bid))
+            row = c.fetchone()
+            game = row[0] if row else None
+        c.execute('DELETE FROM reservations WHERE game_key = ? AND user_id = ? AND amount = ?', (game, user, bid))
+        if c.rowcount != 1:
+            raise ValueError(f"bid of {bid} was not reserved for {user!r}")
+    
+    def load_statistics(self):
+        with self.pool.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(f"SELECT {', '.join(column for column, _ in ROLLUP_COLUMNS)} FROM stats_rollup "
+                      "WHERE scope = 'all'")
+            return c.fetchone() or (0,) * len(ROLLUP_COLUMNS)
+    
+    def load_statistics_by(self, scope, limit):
+        with self.pool.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(f'''
+                SELECT key, {', '.join(column for column, _ in ROLLUP_COLUMNS)} FROM stats_rollup
+                WHERE scope = ? ORDER BY key {'DESC' if scope == 'day' else ''} LIMIT ?
+            ''', (scope, -1 if limit is None else limit))
+            return c.fetchall()
+    
+    def load_statistics_since(self, hours, difficulty, winner):
+        where, params = _history_filters(hours, difficulty, winner)
+        with self.pool.get_connection() as conn:
+            c = conn.cursor()
+            totals = ', '.join(f"COALESCE(SUM({term.format(row='')}), 0)" for _, term in ROLLUP_COLUMNS)
+            c.execute(f'SELECT {totals} FROM game_stats{where}', params)
+            return c.fetchone()
+    
+    def load_history(self, hours, bucket, difficulty, winner):
+        where, params = _history_filters(hours, difficulty, winner)
+        with self.pool.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(f'''
+                SELECT strftime(?, timestamp) AS bucket, COUNT(*),
+                       TOTAL(winner = 'Flowers'), TOTAL(winner = 'Butterflies'), TOTAL(winner = 'Bees'),
+                       TOTAL(winner = 'Draw')
+                FROM game_stats{where}
+                GROUP BY bucket ORDER BY bucket
+            ''', [HISTORY_BUCKETS[bucket]] + params)
+            return [(row[0], row[1]) + tuple(int(wins) for wins in row[2:]) for row in c.fetchall()]
+    
+    def load_recent_games(self, limit, before_id, difficulty, winner):
+        where, params = _history_filters(None, difficulty, winner)
+        if before_id is not None:
+            where += (' AND ' if where else ' WHERE ') + 'id < ?'
+            params.append(before_id)
+        with self.pool.get_connection() as conn:
+            c = conn.cursor()
+            c.execute(f'''
+                SELECT id, timestamp, winner, difficulty, total_moves, bee_interruptions, player_bid, ai_bid,
+                       bee_bid, payout_amount
+                FROM game_stats{where}
+                ORDER BY id DESC LIMIT ?
+            ''', params + [limit])
+            return c.fetchall()
+    
+    def load_search_statistics(self):
+        with self.pool.get_connection() as conn:
+            c = conn.cursor()
+            c.execute('''
+                SELECT difficulty, games, ai_moves, total_time, max_time, total_nodes, max_depth, tt_hits
+                FROM search_rollup ORDER BY difficulty
+            ''')
+            return c.fetchall()
+    
+    def load_packed_moves(self, game_id):
+        with self.pool.get_connection() as conn:
+            c = conn.cursor()
+            c.execute('''
+                SELECT g.difficulty, m.board_size, m.win_length, m.moves
+                FROM game_moves m JOIN game_stats g ON g.id = m.game_id
+                WHERE m.game_id = ?
+            ''', (game_id,))
+            return c.fetchone()
+    
+    def metrics(self):
+        return {'backend': self.name, **self.pool.metrics()}
+    
+    def close(self):
+        self.pool.close()
+
+def _utc_timestamp(seconds=None):
+    """A UTC time in SQLite's CURRENT_TIMESTAMP format, which sorts as text"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(seconds))
+
+def _reservation_cutoff():
+    """Reservations made before this _utc_timestamp are stale"""
+    return _utc_timestamp(time.time() - RESERVATION_TIMEOUT)
+
+def _rollup_terms(winner, total_moves, bee_interruptions, player_bid, ai_bid, payout):
+    """One game's contribution to each ROLLUP_COLUMNS total, as ints like the SQLite sums"""
+    return (1, int(winner == 'Flowers'), int(winner == 'Butterflies'), int(winner == 'Bees'), int(winner == 'Draw'),
+            total_moves, bee_interruptions, player_bid, ai_bid, payout)
+
+class MemoryStorage(GardenStorage):
+    """Everything in this process's memory, gone when it exits: for benchmarks, simulations and load tests.
+    
+    Each change is an entry (a JSON-ready dict) checked and then applied
+    under one lock; LogStorage writes the same entries to its log. Games are
+    kept as tuples with their moves packed, and statistics are rolled up as
+    games are added, as the SQLite triggers do, so reads do not slow down
+    as the history grows.
+    """
+    name = 'memory'
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        # user -> [coins, reserved, total_wagered, total_won, games_played]
+        self.wallets = {}
+        # Game key -> (user, amount, reserved_at), oldest first
+        self.reservations = {}
+        # Game id - 1 -> (timestamp, winner, difficulty, total_moves, bee_interruptions, player_bid,
+        # ai_bid, bee_bid, payout, board_size, win_length, moves); timestamps kept alongside for window bisects
+        self.games = []
+        self.timestamps = []
+        # ROLLUP_SCOPES scope -> key -> ROLLUP_COLUMNS totals
+        self.rollups = {scope: {} for scope in ROLLUP_SCOPES}
+        # difficulty -> [games, ai_moves, total_time, max_time, total_nodes, max_depth, tt_hits]
+        self.search_rollup = {}
+    
+    def get_player_wallet(self, user):
+        stale_before = _reservation_cutoff()
+        with self.lock:
+            stale = [game for game, (owner, _, reserved_at) in self.reservations.items()
+                     if owner == user and reserved_at < stale_before]
+            if stale:
+                self._commit({'op': 'release', 'user': user, 'games': stale})
+            return self._wallet(user)
+    
+    def update_player_wallet(self, coin_change, wagered, won, user):
+        with self.lock:
+            if self._wallet(user)[0] + coin_change < 0:
+                raise ValueError(f"wallet of {user!r} cannot go below zero")
+            self._commit({'op': 'wallet', 'user': user, 'coins': coin_change, 'wagered': wagered, 'won': won})
+    
+    def reserve_bet(self, amount, user, game):
+        with self.lock:
+            if game in self.reservations:
+                raise ValueError(f"game {game!r} already has a reserved bid")
+            if self._wallet(user)[0] < amount:
+                return False
+            self._commit({'op': 'reserve', 'user': user, 'amount': amount, 'game': game, 'time': _utc_timestamp()})
+            return True
+    
+    def reset_wallet(self, user, live_game):
+        with self.lock:
+            self._commit({'op': 'reset', 'user': user, 'live': live_game})
+    
+    def save_game_results(self, results):
+        games = [self._game_entry(result) for result in results]
+        with self.lock:
+            self._commit({'op': 'games', 'time': _utc_timestamp(), 'settle': False, 'games': games})
+    
+    def settle_games(self, results):
+        games = [self._game_entry(result) for result in results]
+        with self.lock:
+            # Pin each game to its reservation, so a replayed log settles the same ones
+            claimed = set()
+            for game in games:
+                user, bid, key = game['user'], game['player_bid'], game['game']
+                if key is None:
+                    key = next((key for key, (owner, amount, _) in self.reservations.items()
+                                if owner == user and amount == bid and key not in claimed), None)
+                if key in claimed or self.reservations.get(key, (None, None))[:2] != (user, bid):
+                    raise ValueError(f"bid of {bid} was not reserved for {user!r}")
+                claimed.add(key)
+                game['game'] = key
+            self._commit({'op': 'games', 'time': _utc_timestamp(), 'settle': True, 'games': games})
+    
+    def _wallet(self, user):
+        """A copy of user's wallet for checks, which open no wallet themselves"""
+        return tuple(self.wallets.get(user, (STARTING_COINS, 0, 0, 0, 0)))
+    
+    def _open_wallet(self, user):
+        """The wallet list of user, opened with STARTING_COINS if new"""
+        wallet = self.wallets.get(user)
+        if wallet is None:
+            wallet = self.wallets[user] = [STARTING_COINS, 0, 0, 0, 0]
+        return wallet
+    
+    @staticmethod
+    def _game_entry(result):
+        game = {field: result[field] for field in ('winner', 'difficulty', 'total_moves', 'bee_interruptions',
+                                                   'player_bid', 'ai_bid', 'bee_bid', 'payout', 'board_size',
+                                                   'win_length', 'search_summary', 'user', 'game')}
+        game['moves'] = pack_moves(result['move_history'], result['board_size']).hex()
+        return game
+    
+    def _commit(self, entry):
+        """Make a checked change; the caller holds the lock"""
+        self._apply(entry)
+    
+    def _apply(self, entry):
+        op = entry['op']
+        if op == 'games':
+            for game in entry['games']:
+                self._add_game(entry['time'], game, entry['settle'])
+            return
+        user = entry['user']
+        wallet = self._open_wallet(user)
+        if op == 'reserve':
+            wallet[0] -= entry['amount']
+            wallet[1] += entry['amount']
+            self.reservations[entry['game']] = (user, entry['amount'], entry['time'])
+        elif op == 'release':
+            for game in entry['games']:
+                _, amount, _ = self.reservations.pop(game)
+                wallet[0] += amount
+                wallet[1] -= amount
+        elif op == 'wallet':
+            wallet[0] += entry['coins']
+            wallet[2] += entry['wagered']
+            wallet[3] += entry['won']
+            wallet[4] += 1
+        elif op == 'reset':
+            for game in [game for game, (owner, _, _) in self.reservations.items()
+                         if owner == user and game != entry['live']]:
+                del self.reservations[game]
+            live = self.reservations.get(entry['live'])
+            wallet[0] = STARTING_COINS
+            wallet[1:] = [live[1] if live and live[0] == user else 0, 0, 0, 0]
+        else:
+            raise ValueError(f"unknown storage entry {op!r}")
+    
+    def _add_game(self, timestamp, game, settle):
+        if settle:
+            del self.reservations[game['game']]
+            wallet = self._open_wallet(game['user'])
+            wallet[0] += game['payout']
+            wallet[1] -= game['player_bid']
+            wallet[2] += game['player_bid']
+            wallet[3] += game['payout']
+            wallet[4] += 1
+        self.games.append((timestamp, game['winner'], game['difficulty'], game['total_moves'],
+                           game['bee_interruptions'], game['player_bid'], game['ai_bid'], game['bee_bid'],
+                           game['payout'], game['board_size'], game.get('win_length', WIN_LENGTH),
+                           bytes.fromhex(game['moves'])))
+        self.timestamps.append(timestamp)
+        
+        terms = _rollup_terms(game['winner'], game['total_moves'], game['bee_interruptions'], game['player_bid'],
+                              game['ai_bid'], game['payout'])
+        # The keys ROLLUP_SCOPES gives each scope
+        for scope, key in (('all', ''), ('difficulty', game['difficulty']), ('day', timestamp[:10])):
+            totals = self.rollups[scope].get(key)
+            if totals is None:
+                self.rollups[scope][key] = list(terms)
+            else:
+                for i, term in enumerate(terms):
+                    totals[i] += term
+        
+        summary = game['search_summary']
+        if summary is not None:
+            totals = self.search_rollup.get(game['difficulty'])
+            if totals is None:
+                self.search_rollup[game['difficulty']] = [1, summary['ai_moves'], summary['total_time'],
+                                                          summary['max_time'], summary['total_nodes'],
+                                                          summary['max_depth'], summary['tt_hits']]
+            else:
+                totals[0] += 1
+                totals[1] += summary['ai_moves']
+                totals[2] += summary['total_time']
+                totals[3] = max(totals[3], summary['max_time'])
+                totals[4] += summary['total_nodes']
+                totals[5] = max(totals[5], summary['max_depth'])
+                totals[6] += summary['tt_hits']
+    
+    def _window(self, hours, difficulty, winner):
+        """(id, game) of the games of the last hours matching the filters, oldest first"""
+        start = 0 if hours is None else bisect.bisect_left(self.timestamps, _utc_timestamp(time.time() - hours * 3600))
+        for index in range(start, len(self.games)):
+            game = self.games[index]
+            if (difficulty is None or game[2] == difficulty) and (winner is None or game[1] == winner):
+                yield index + 1, game
+    
+    def load_statistics(self):
+        with self.lock:
+            return tuple(self.rollups['all'].get('', (0,) * len(ROLLUP_COLUMNS)))
+    
+    def load_statistics_by(self, scope, limit):
+        with self.lock:
+            rows = sorted(((key, *totals) for key, totals in self.rollups[scope].items()),
+                          reverse=scope == 'day')
+        return rows[:limit]
+    
+    def load_statistics_since(self, hours, difficulty, winner):
+        totals = [0] * len(ROLLUP_COLUMNS)
+        with self.lock:
+            for _, game in self._window(hours, difficulty, winner):
+                for i, term in enumerate(_rollup_terms(game[1], game[3], game[4], game[5], game[6], game[8])):
+                    totals[i] += term
+        return tuple(totals)
+    
+    def load_history(self, hours, bucket, difficulty, winner):
+        buckets = {}
+        with self.lock:
+            for _, game in self._window(hours, difficulty, winner):
+                # The HISTORY_BUCKETS formats, cut from the timestamp text
+                key = game[0][:13] + ':00' if bucket == 'hour' else game[0][:10]
+                counts = buckets.get(key)
+                if counts is None:
+                    counts = buckets[key] = [0, 0, 0, 0, 0]
+                counts[0] += 1
+                counts[1 + OUTCOMES.index(game[1])] += 1
+        return [(key, *counts) for key, counts in sorted(buckets.items())]
+    
+    def load_recent_games(self, limit, before_id, difficulty, winner):
+        rows = []
+        with self.lock:
+            end = len(self.games) if before_id is None else min(before_id - 1, len(self.games))
+            for index in range(end - 1, -1, -1):
+                game = self.games[index]
+                if (difficulty is None or game[2] == difficulty) and (winner is None or game[1] == winner):
+                    rows.append((index + 1,) + game[:9])
+                    if len(rows) == limit:
+                        break
+        return rows
+    
+    def load_search_statistics(self):
+        with self.lock:
+            return [(difficulty, *totals) for difficulty, totals in sorted(self.search_rollup.items())]
+    
+    def load_packed_moves(self, game_id):
+        with self.lock:
+            if not 1 <= game_id <= len(self.games):
+                return None
+            game = self.games[game_id - 1]
+        return game[2], game[9], game[10], game[11]
+    
+    def metrics(self):
+        with self.lock:
+            return {'backend': self.name, 'users': len(self.wallets), 'games': len(self.games)}
+
+class LogStorage(MemoryStorage):
+    """MemoryStorage that appends every change to a JSON lines log first and replays the log when opened.
+    
+    The log only grows and reads never touch it, so writes cost one
+    buffered append (and an fsync with LOG_FSYNC). A line torn by a crash
+    mid-write is skipped on replay.
+    """
+    name = 'log'
+    
+    def __init__(self, path=None):
+        super().__init__()
+        self.path = path or LOG_PATH
+        self.replayed = 0
+        complete = True
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    complete = line.endswith('\n')
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        logger.warning("Skipped a torn entry in %s", self.path)
+                        continue
+                    self._apply(entry)
+                    self.replayed += 1
+        self.file = open(self.path, 'a', encoding='utf-8')
+        if not complete:
+            # Keep the torn line apart from the next entry
+            self.file.write('\n')
+    
+    def _commit(self, entry):
+        self.file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self.file.flush()
+        if LOG_FSYNC:
+            os.fsync(self.file.fileno())
+        self._apply(entry)
+    
+    def metrics(self):
+        return {**super().metrics(), 'replayed': self.replayed, 'log_bytes': self.file.tell()}
+    
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+STORAGE_BACKENDS = {
+    'sqlite': SQLiteStorage,
+    'memory': MemoryStorage,
+    'log': LogStorage
+}
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """The process's storage backend, a STORAGE_BACKEND opened on first use"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = STORAGE_BACKENDS[STORAGE_BACKEND]()
+    return _storage
+
+def use_storage(backend, **options):
+    """Switch the process to a new backend, e.g. use_storage('log', path='load.log'), and return it.
+    
+    Results still queued for write-behind are written to the old backend,
+    which is then closed.
+    """
+    global _storage
+    storage = STORAGE_BACKENDS[backend](**options)
+    if _writer is not None:
+        _writer.flush()
+    with _storage_lock:
+        previous, _storage = _storage, storage
+    if previous is not None:
+        previous.close()
+    return storage
+
+# Storage functions
+def init_db():
+    """Initialize the storage backend; otherwise done on first use"""
+    get_storage().init()
+
+def get_player_wallet(user=DEFAULT_USER):
+    """Get a user's wallet, opening it with STARTING_COINS on first use; coins excludes reserved bids.
+    
+    Bids reserved more than RESERVATION_TIMEOUT seconds ago, whose games
+    were abandoned, go back to the balance first.
+    """
+    coins, reserved, total_wagered, total_won, games_played = get_storage().get_player_wallet(user)
+    return {
+        'coins': coins,
+        'reserved': reserved,
+        'total_wagered': total_wagered,
+        'total_won': total_won,
+        'games_played': games_played
+    }
+
+def update_player_wallet(coin_change, wagered=0, won=0, user=DEFAULT_USER):
+    """Update a wallet after a game whose bid was not reserved"""
+    get_storage().update_player_wallet(coin_change, wagered, won, user)
+
+def reserve_bet(amount, user=DEFAULT_USER, game=None):
+    """Move a bid from the user's balance into reserved for a game; the game's key, or None if the balance is short.
+    
+    game is the key to settle the game under, a new one if not given. The
+    check and the deduction are atomic, so two sessions betting at once
+    cannot both spend the same coins.
+    """
+    game = game or uuid.uuid4().hex
+    return game if get_storage().reserve_bet(amount, user, game) else None
+
+def reset_wallet(user=DEFAULT_USER, live_game=None):
+    """Reset a wallet to the starting amount; only live_game's bid, if given, stays reserved"""
+    get_storage().reset_wallet(user, live_game)
+
+def _game_result(winner, difficulty, total_moves, bee_interruptions, player_bid, ai_bid, bee_bid, payout, move_history,
+                 search_summary, board_size, win_length, user, game=None):
+    return {
+        'winner': winner,
+        'difficulty': difficulty,
+        'total_moves': total_moves,
+        'bee_interruptions': bee_interruptions,
+        'player_bid': player_bid,
+        'ai_bid': ai_bid,
+        'bee_bid': bee_bid,
+        'payout': payout,
+        'move_history': move_history,
+        'search_summary': search_summary,
+        'board_size': board_size,
+        'win_length': win_length,
+        'user': user,
+        'game': game
+    }
+
+def save_game_result(winner, difficulty, total_moves, bee_interruptions, player_bid, ai_bid, bee_bid, payout, move_history,
+                     search_summary=None, board_size=BOARD_SIZE, win_length=WIN_LENGTH):
+    """Save game result with auction betting information, its packed moves and, if given, the AI's search totals"""
+    get_storage().save_game_results([_game_result(winner, difficulty, total_moves, bee_interruptions, player_bid,
+                                                  ai_bid, bee_bid, payout, move_history, search_summary, board_size,
+                                                  win_length, None)])
+
+def settle_game(winner, difficulty, total_moves, bee_interruptions, player_bid, ai_bid, bee_bid, payout, move_history,
+                search_summary=None, board_size=BOARD_SIZE, win_length=WIN_LENGTH, user=DEFAULT_USER, game=None,
+                write_behind=None, on_commit=None):
+    """Pay out a finished game and record it: wallet update and result rows in one transaction.
+    
+    The player's bid must have been reserved with reserve_bet; settling
+    releases the reservation of game, the key reserve_bet returned (the
+    user's oldest reservation of the same bid if None), and credits the
+    payout. ValueError if there is none, e.g. once it went stale.
+    
+    With write_behind (default WRITE_BEHIND) the game is queued for the
+    background ResultWriter and this returns at once. on_commit, if given, is
+    called without arguments once the game is committed, e.g. to drop cached
+    statistics; with write-behind that happens on the writer thread.
+    """
+    result = _game_result(winner, difficulty, total_moves, bee_interruptions, player_bid, ai_bid, bee_bid, payout,
+                          move_history, search_summary, board_size, win_length, user, game)
+    if WRITE_BEHIND if write_behind is None else write_behind:
+        get_result_writer().submit(result, on_commit)
+    else:
+        settle_games([result])
+        if on_commit is not None:
+            on_commit()
+
+def settle_games(results):
+    """Settle a batch of settle_game results in a single transaction"""
+    get_storage().settle_games(results)
+
+def load_statistics():
+    """Get game statistics with auction info, read from the overall rollup"""
+    return _rollup_statistics(get_storage().load_statistics())
+
+def load_statistics_by(scope, limit=None):
+    """load_statistics per difficulty or per day ('difficulty' or 'day'), newest day first"""
+    if scope not in ROLLUP_SCOPES or scope == 'all':
+        raise ValueError(f"unknown statistics scope {scope!r}")
+    return [{scope: row[0], **_rollup_statistics(row[1:])} for row in get_storage().load_statistics_by(scope, limit)]
+
+def load_statistics_since(hours, difficulty=None, winner=None):
+    """load_statistics over the games of the last hours, optionally of one difficulty or winner"""
+    return _rollup_statistics(get_storage().load_statistics_since(hours, difficulty, winner))
+
+def load_history(hours, bucket='day', difficulty=None, winner=None):
+    """Games and wins per hour or day bucket over the last hours, oldest first"""
+    if bucket not in HISTORY_BUCKETS:
+        raise ValueError(f"unknown history bucket {bucket!r}")
+    return [{
+        'bucket': row[0],
+        'games': row[1],
+        'flower_wins': row[2],
+        'butterfly_wins': row[3],
+        'bee_wins': row[4],
+        'draws': row[5]
+    } for row in get_storage().load_history(hours, bucket, difficulty, winner)]
+
+def load_recent_games(limit=RECENT_GAMES_PAGE, before_id=None, difficulty=None, winner=None):
+    """A page of saved games, newest first; pass the last id of a page as before_id for the next.
+    
+    Pages are keyed on the id rather than offset, so every page costs the
+    same however deep into the history it is.
+    """
+    return [dict(zip(GAME_COLUMNS, row)) for row in get_storage().load_recent_games(limit, before_id, difficulty, winner)]
+
+def load_search_statistics():
+    """AI search totals per difficulty over all saved games"""
+    return [_search_statistics(*row) for row in get_storage().load_search_statistics()]
+
+def load_game_moves(game_id):
+    """A saved game's (player, row, col) moves in order, or None if it has none stored"""
+    row = get_storage().load_packed_moves(game_id)
+    return unpack_moves(row[3], row[1]) if row else None
+
+def load_game_position(game_id, ply=None):
+    """A saved game replayed to its first ply moves (to the end by default), or None"""
+    row = get_storage().load_packed_moves(game_id)
+    if row is None:
+        return None
+    difficulty, board_size, win_length, moves = row
+    return replay_moves(unpack_moves(moves, board_size), ply, difficulty, board_size, win_length)
+
+def storage_metrics():
+    """The backend's name and counters, such as its connection pool's for SQLite"""
+    return get_storage().metrics()
+
+class ResultWriter:
+    """Background thread draining queued game results into batched commits.
+    
+    A batch closes when it reaches batch_size results or interval seconds
+    after its first one. close() (registered with atexit) writes whatever is
+    still queued before the process exits; flush() waits until everything
+    submitted so far is committed.
+    """
+    
+    def __init__(self, batch_size=WRITE_BEHIND_BATCH, interval=WRITE_BEHIND_INTERVAL):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = queue.Queue()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name='garden-result-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+    
+    def submit(self, result, on_commit=None):
+        if self.closed:
+            self._write([(result, on_commit)])
+        else:
+            self.queue.put((result, on_commit))
+    
+    def flush(self):
+        self.queue.join()
+    
+    def close(self, timeout=10.0):
+        if not self.closed:
+            self.closed = True
+            self.queue.put(None)
+            self.thread.join(timeout)
+    
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            item = self.queue.get()
+            deadline = time.monotonic() + self.interval
+            while True:
+                if item is None:
+                    stopping = True
+                    self.queue.task_done()
+                else:
+                    batch.append(item)
+                if stopping or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                # Whatever goes wrong, the thread keeps draining and flush() returns
+                try:
+                    self._write(batch)
+                except Exception:
+                    logger.exception("Dropped %d game results", len(batch))
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+    
+    def _write(self, batch):
+        committed = self._commit(batch)
+        if committed is None:
+            # A result the backend refuses fails alone
+            for item in batch:
+                self._write([item])
+            return
+        for _, on_commit in committed:
+            if on_commit is not None:
+                try:
+                    on_commit()
+                except Exception:
+                    logger.exception("Game result commit callback failed")
+    
+    def _commit(self, batch):
+        """The items committed, or None if a batch of several has to be split"""
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                settle_games([result for result, _ in batch])
+                return batch
+            except (sqlite3.OperationalError, OSError):
+                # Locked or busy database, pool timeout, full disk: worth another try
+                if attempt == WRITE_ATTEMPTS:
+                    logger.exception("Dropped %d game results after %d attempts", len(batch), attempt)
+                    return []
+                time.sleep(0.1 * attempt)
+            except Exception:
+                # Anything else is down to a result, e.g. an unreserved bid or a malformed move list
+                if len(batch) > 1:
+                    return None
+                logger.exception("Rejected game result")
+                return []
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_result_writer():
+    """The process's ResultWriter, started on first use"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ResultWriter()
+    return _writer
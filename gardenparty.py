@@ -1,67 +1,43 @@
 import streamlit as st
-import sqlite3
-import random
 from datetime import datetime
 from typing import List, Tuple, Optional
-import json
 import pandas as pd
-from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import logging
 import threading
-
-# Page configuration
-st.set_page_config(
-    page_title="Garden Tic-Tac-Toe Auction",
-    page_icon="🌸",
-    layout="centered",
-    initial_sidebar_state="collapsed"
+import time
+import uuid
+from garden_engine import (
+    EMPTY, FLOWER, BUTTERFLY, BEE, TT_MAX_BYTES, SEARCH_BRANCHES,
+    SearchStats, TranspositionTable, game_from_bytes, new_game, summarize_search_stats
+)
+from garden_book import load_opening_book
+from garden_auction import (
+    MIN_BET, MAX_BET, AUCTION_INCREMENT,
+    calculate_ai_bid, calculate_bee_bid, calculate_auction_payout, game_outcome
+)
+from garden_storage import (
+    storage_metrics, get_player_wallet, reserve_bet, reset_wallet, settle_game,
+    RECENT_GAMES_PAGE, load_statistics, load_statistics_by, load_statistics_since, load_history,
+    load_recent_games, load_search_statistics
 )
 
-# Constants
-BOARD_SIZE = 5
-WIN_LENGTH = 5
-EMPTY = '.'
-FLOWER = 'X'
-BUTTERFLY = 'O'
-BEE = 'B'
-STARTING_COINS = 1000
-MIN_BET = 10
-MAX_BET = 500
-AUCTION_INCREMENT = 5
-
-# Thread-safe database connection pool
-class DatabasePool:
-    _instance = None
-    _lock = threading.Lock()
-    
-    def __new__(cls):
-        if cls._instance is None:
-            with cls._lock:
-                if cls._instance is None:
-                    cls._instance = super().__new__(cls)
-                    cls._instance.local = threading.local()
-        return cls._instance
-    
-    @contextmanager
-    def get_connection(self):
-        """Get thread-safe database connection"""
-        if not hasattr(self.local, 'conn'):
-            self.local.conn = sqlite3.connect('garden_tictactoe.db', 
-                                             check_same_thread=False,
-                                             timeout=30.0,
-                                             isolation_level='DEFERRED')
-            self.local.conn.execute('PRAGMA journal_mode=WAL')
-            self.local.conn.execute('PRAGMA synchronous=NORMAL')
-            self.local.conn.execute('PRAGMA cache_size=10000')
-            self.local.conn.execute('PRAGMA temp_store=MEMORY')
-        
-        try:
-            yield self.local.conn
-        except Exception as e:
-            self.local.conn.rollback()
-            raise e
+# AI replies are computed on a shared worker pool while the script polls
+AI_WORKERS = 4
+AI_POLL_INTERVAL = 0.1
+# Seconds after which a pending search is told to play its best move so far
+AI_MOVE_TIMEOUT = 3.0
+# Stats panel periods in hours; None reads the all-time rollups
+STATS_PERIODS = {
+    'All time': None,
+    'Last 24 hours': 24,
+    'Last 7 days': 24 * 7,
+    'Last 30 days': 24 * 30
+}
+logger = logging.getLogger(__name__)
 
 # Custom CSS with Charcoal/Black Board Theme
-st.markdown("""
+PAGE_CSS = """
 <style>
     .main {
         padding: 0.5rem;
@@ -281,332 +257,63 @@ st.markdown("""
         border: 3px solid #ff0000;
     }
 </style>
-""", unsafe_allow_html=True)
-
-# Database functions
-def init_db():
-    """Initialize SQLite database with auction betting tables"""
-    db_pool = DatabasePool()
-    with db_pool.get_connection() as conn:
-        c = conn.cursor()
-        
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS game_stats (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                winner TEXT NOT NULL,
-                difficulty TEXT NOT NULL,
-                total_moves INTEGER NOT NULL,
-                bee_interruptions INTEGER NOT NULL,
-                player_bid INTEGER DEFAULT 0,
-                ai_bid INTEGER DEFAULT 0,
-                bee_bid INTEGER DEFAULT 0,
-                payout_amount INTEGER DEFAULT 0,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS player_wallet (
-                id INTEGER PRIMARY KEY,
-                coins INTEGER NOT NULL DEFAULT 1000,
-                total_wagered INTEGER DEFAULT 0,
-                total_won INTEGER DEFAULT 0,
-                games_played INTEGER DEFAULT 0
-            )
-        ''')
-        
-        # Initialize wallet if not exists
-        c.execute('SELECT COUNT(*) FROM player_wallet WHERE id = 1')
-        if c.fetchone()[0] == 0:
-            c.execute('INSERT INTO player_wallet (id, coins) VALUES (1, ?)', (STARTING_COINS,))
-        
-        conn.commit()
+"""
 
-def get_player_wallet():
-    """Get player's current wallet balance"""
-    db_pool = DatabasePool()
-    with db_pool.get_connection() as conn:
-        c = conn.cursor()
-        c.execute('SELECT coins, total_wagered, total_won, games_played FROM player_wallet WHERE id = 1')
-        result = c.fetchone()
-        return {
-            'coins': result[0],
-            'total_wagered': result[1],
-            'total_won': result[2],
-            'games_played': result[3]
-        }
+# Statistics are cached until a game commits; see invalidate_statistics
+@st.cache_data
+def get_statistics():
+    """Get game statistics with auction info"""
+    return load_statistics()
 
-def update_player_wallet(coin_change, wagered=0, won=0):
-    """Update player's wallet after a game"""
-    db_pool = DatabasePool()
-    with db_pool.get_connection() as conn:
-        c = conn.cursor()
-        c.execute('''
-            UPDATE player_wallet 
-            SET coins = coins + ?,
-                total_wagered = total_wagered + ?,
-                total_won = total_won + ?,
-                games_played = games_played + 1
-            WHERE id = 1
-        ''', (coin_change, wagered, won))
-        conn.commit()
+@st.cache_data
+def get_difficulty_statistics():
+    """Game statistics per AI difficulty"""
+    return load_statistics_by('difficulty')
 
-def reset_wallet():
-    """Reset wallet to starting amount"""
-    db_pool = DatabasePool()
-    with db_pool.get_connection() as conn:
-        c = conn.cursor()
-        c.execute('''
-            UPDATE player_wallet 
-            SET coins = ?,
-                total_wagered = 0,
-                total_won = 0,
-                games_played = 0
-            WHERE id = 1
-        ''', (STARTING_COINS,))
-        conn.commit()
+@st.cache_data
+def get_search_statistics():
+    """AI search totals per difficulty over all saved games"""
+    return load_search_statistics()
 
-def save_game_result(winner, difficulty, total_moves, bee_interruptions, player_bid, ai_bid, bee_bid, payout, move_history):
-    """Save game result with auction betting information"""
-    db_pool = DatabasePool()
-    with db_pool.get_connection() as conn:
-        c = conn.cursor()
-        c.execute('BEGIN TRANSACTION')
-        try:
-            c.execute('''
-                INSERT INTO game_stats (winner, difficulty, total_moves, bee_interruptions, 
-                                       player_bid, ai_bid, bee_bid, payout_amount)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (winner, difficulty, total_moves, bee_interruptions, player_bid, ai_bid, bee_bid, payout))
-            c.execute('COMMIT')
-        except Exception as e:
-            c.execute('ROLLBACK')
-            raise e
+# Windows also move with the clock, so they expire as well
+@st.cache_data(ttl=60)
+def get_window_statistics(hours):
+    """Game statistics over the last hours"""
+    return load_statistics_since(hours)
 
 @st.cache_data(ttl=60)
-def get_statistics():
-    """Get game statistics with auction info"""
-    db_pool = DatabasePool()
-    with db_pool.get_connection() as conn:
-        c = conn.cursor()
-        c.execute('''
-            SELECT 
-                SUM(CASE WHEN winner = 'Flowers' THEN 1 ELSE 0 END) as flower_wins,
-                SUM(CASE WHEN winner = 'Butterflies' THEN 1 ELSE 0 END) as butterfly_wins,
-                SUM(CASE WHEN winner = 'Draw' THEN 1 ELSE 0 END) as draws,
-                AVG(total_moves) as avg_moves,
-                SUM(bee_interruptions) as total_bees,
-                AVG(player_bid) as avg_player_bid,
-                AVG(ai_bid) as avg_ai_bid,
-                SUM(payout_amount) as total_payout
-            FROM game_stats
-        ''')
-        result = c.fetchone()
-        return {
-            'flower_wins': result[0] or 0,
-            'butterfly_wins': result[1] or 0,
-            'draws': result[2] or 0,
-            'avg_moves': result[3] or 0,
-            'total_bees': result[4] or 0,
-            'avg_player_bid': result[5] or 0,
-            'avg_ai_bid': result[6] or 0,
-            'total_payout': result[7] or 0
-        }
+def get_history(hours):
+    """Games and wins per hour (up to two days) or per day over the last hours"""
+    return load_history(hours, 'hour' if hours <= 48 else 'day')
 
-# Game logic classes
-class Move:
-    __slots__ = ['row', 'col', 'score']
-    
-    def __init__(self, row=-1, col=-1, score=0):
-        self.row = row
-        self.col = col
-        self.score = score
+@st.cache_data
+def get_recent_games(before_id):
+    """A page of saved games older than before_id, newest first"""
+    return load_recent_games(RECENT_GAMES_PAGE, before_id)
 
-class GardenTicTacToe:
-    def __init__(self, difficulty='Medium'):
-        self.board = [[EMPTY for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-        self.difficulty = difficulty
-        self.move_count = 0
-        self.bee_interruptions = 0
-        self.move_history = []
-        self._lines_cache = None
-        
-    def is_valid_move(self, row, col):
-        return 0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE and self.board[row][col] == EMPTY
-    
-    def make_move(self, row, col, player):
-        if not self.is_valid_move(row, col):
-            return False
-        self.board[row][col] = player
-        self.move_count += 1
-        self.move_history.append((player, row, col))
-        return True
-    
-    def get_all_lines(self):
-        if self._lines_cache is None:
-            lines = []
-            for i in range(BOARD_SIZE):
-                lines.append([(i, j) for j in range(BOARD_SIZE)])
-            for j in range(BOARD_SIZE):
-                lines.append([(i, j) for i in range(BOARD_SIZE)])
-            lines.append([(i, i) for i in range(BOARD_SIZE)])
-            lines.append([(i, BOARD_SIZE-1-i) for i in range(BOARD_SIZE)])
-            self._lines_cache = lines
-        return self._lines_cache
-    
-    def evaluate_line(self, line, player, opponent):
-        player_count = sum(1 for r, c in line if self.board[r][c] == player)
-        opp_count = sum(1 for r, c in line if self.board[r][c] == opponent)
-        empty_count = sum(1 for r, c in line if self.board[r][c] == EMPTY)
-        bee_count = sum(1 for r, c in line if self.board[r][c] == BEE)
-        
-        if (player_count > 0 and opp_count > 0) or bee_count > 0:
-            return 0
-        
-        if player_count == 5: return 100000
-        if opp_count == 5: return -100000
-        if player_count == 4 and empty_count == 1: return 10000
-        if opp_count == 4 and empty_count == 1: return -10000
-        if player_count == 3 and empty_count == 2: return 1000
-        if opp_count == 3 and empty_count == 2: return -1000
-        if player_count == 2 and empty_count == 3: return 100
-        if opp_count == 2 and empty_count == 3: return -100
-        if player_count == 1 and empty_count == 4: return 10
-        
-        return 0
-    
-    def evaluate_board(self, player, opponent):
-        total_score = 0
-        for line in self.get_all_lines():
-            total_score += self.evaluate_line(line, player, opponent)
-        return total_score
-    
-    def get_positional_bonus(self, row, col):
-        if row == 2 and col == 2: return 50
-        if abs(row - 2) <= 1 and abs(col - 2) <= 1: return 30
-        if (row == 0 or row == 4) and (col == 0 or col == 4): return 20
-        return 0
-    
-    def find_immediate_win(self, player):
-        for i in range(BOARD_SIZE):
-            for j in range(BOARD_SIZE):
-                if self.board[i][j] == EMPTY:
-                    self.board[i][j] = player
-                    if self.check_win(player):
-                        self.board[i][j] = EMPTY
-                        return Move(i, j, 100000)
-                    self.board[i][j] = EMPTY
-        return Move()
-    
-    def count_winning_threats(self, player):
-        threats = 0
-        for line in self.get_all_lines():
-            player_count = sum(1 for r, c in line if self.board[r][c] == player)
-            empty_count = sum(1 for r, c in line if self.board[r][c] == EMPTY)
-            if player_count == 4 and empty_count == 1:
-                threats += 1
-        return threats
-    
-    def find_fork_moves(self, player):
-        fork_moves = []
-        for i in range(BOARD_SIZE):
-            for j in range(BOARD_SIZE):
-                if self.board[i][j] == EMPTY:
-                    self.board[i][j] = player
-                    threats = self.count_winning_threats(player)
-                    if threats >= 2:
-                        fork_moves.append(Move(i, j, threats * 1000))
-                    self.board[i][j] = EMPTY
-        return sorted(fork_moves, key=lambda x: x.score, reverse=True)
-    
-    def get_ai_move(self, ai_player, human_player):
-        win_move = self.find_immediate_win(ai_player)
-        if win_move.row != -1:
-            return win_move, "🎯 AI found winning move!"
-        
-        block_move = self.find_immediate_win(human_player)
-        if block_move.row != -1:
-            return block_move, "🛡️ AI blocking your winning move!"
-        
-        if self.difficulty in ['Medium', 'Hard']:
-            fork_moves = self.find_fork_moves(ai_player)
-            if fork_moves:
-                return fork_moves[0], "🔱 AI creating a fork!"
-            
-            opp_forks = self.find_fork_moves(human_player)
-            if opp_forks:
-                return opp_forks[0], "🚫 AI blocking your fork!"
-        
-        best_score = float('-inf')
-        best_move = Move()
-        
-        for i in range(BOARD_SIZE):
-            for j in range(BOARD_SIZE):
-                if self.board[i][j] == EMPTY:
-                    self.board[i][j] = ai_player
-                    score = self.evaluate_board(ai_player, human_player) + self.get_positional_bonus(i, j)
-                    self.board[i][j] = EMPTY
-                    
-                    if score > best_score:
-                        best_score = score
-                        best_move = Move(i, j, score)
-        
-        return best_move, "🤖 AI is thinking..."
-    
-    def should_bee_interrupt(self):
-        if self.move_count <= 4:
-            return False
-        
-        bee_chance = {
-            'Easy': 0.10,
-            'Medium': 0.20,
-            'Hard': 0.25
-        }.get(self.difficulty, 0.15)
-        
-        return random.random() < bee_chance
-    
-    def get_strategic_bee_move(self, target_player):
-        best_score = float('-inf')
-        best_move = Move()
-        
-        for i in range(BOARD_SIZE):
-            for j in range(BOARD_SIZE):
-                if self.board[i][j] == EMPTY:
-                    self.board[i][j] = target_player
-                    disruption_score = 0
-                    if self.check_win(target_player):
-                        disruption_score = 10000
-                    self.board[i][j] = EMPTY
-                    
-                    if disruption_score > best_score:
-                        best_score = disruption_score
-                        best_move = Move(i, j, disruption_score)
-        
-        if best_move.row == -1:
-            empty_spaces = [(i, j) for i in range(BOARD_SIZE) for j in range(BOARD_SIZE) 
-                          if self.board[i][j] == EMPTY]
-            if empty_spaces:
-                r, c = random.choice(empty_spaces)
-                best_move = Move(r, c)
-        
-        return best_move
-    
-    def check_win(self, player):
-        for line in self.get_all_lines():
-            if all(self.board[r][c] == player for r, c in line):
-                return True
-        return False
-    
-    def is_board_full(self):
-        return all(self.board[i][j] != EMPTY for i in range(BOARD_SIZE) for j in range(BOARD_SIZE))
+def invalidate_statistics():
+    """Drop the cached statistics once a game is committed"""
+    get_statistics.clear()
+    get_difficulty_statistics.clear()
+    get_search_statistics.clear()
+    get_window_statistics.clear()
+    get_history.clear()
+    get_recent_games.clear()
+
+@st.cache_resource
+def get_transposition_table():
+    """Process-wide transposition table, shared by all sessions and kept across reruns"""
+    return TranspositionTable(TT_MAX_BYTES)
 
-# Initialize database
-init_db()
+@st.cache_resource
+def get_ai_executor():
+    """Process-wide pool running AI searches off the script thread"""
+    return ThreadPoolExecutor(max_workers=AI_WORKERS, thread_name_prefix='garden-ai')
 
 # Initialize session state
 def init_session_state():
     defaults = {
-        'game': None,
+        'game_state': None,
         'current_player': FLOWER,
         'game_over': False,
         'winner': None,
@@ -614,14 +321,21 @@ def init_session_state():
         'ai_message': "",
         'show_stats': False,
         'show_moves': False,
+        'history_pages': [],
         'difficulty': 'Medium',
         'player_first': 'You (🌺 Flowers)',
         'processing_move': False,
+        'ai_future': None,
+        'ai_cancel': None,
+        'ai_started': 0.0,
+        'ai_stats': None,
+        'search_stats': [],
         'auction_phase': 'bidding',
         'player_bid': MIN_BET,
         'ai_bid': 0,
         'bee_bid': 0,
         'auction_complete': False,
+        'game_key': None,
         'total_pot': 0,
         'payout_amount': 0
     }
@@ -630,49 +344,30 @@ def init_session_state():
         if key not in st.session_state:
             st.session_state[key] = value
 
-init_session_state()
+def get_user_id():
+    """Whose wallet this session plays from: the ?user= query parameter, set for new visitors so reloads keep it"""
+    if 'user_id' not in st.session_state:
+        user = st.experimental_get_query_params().get('user', [''])[0]
+        if not user:
+            user = uuid.uuid4().hex[:12]
+            st.experimental_set_query_params(user=user)
+        st.session_state.user_id = user
+    return st.session_state.user_id
 
-def calculate_ai_bid(difficulty, player_bid):
-    """AI determines its bid based on difficulty"""
-    base_bid = {
-        'Easy': int(player_bid * 0.6),
-        'Medium': int(player_bid * 0.9),
-        'Hard': int(player_bid * 1.2)
-    }.get(difficulty, player_bid)
-    
-    # Add some randomness
-    variation = random.randint(-10, 20)
-    return max(MIN_BET, base_bid + variation)
+def load_game():
+    """The session's game, rebuilt from the compact state kept in the session"""
+    state = st.session_state.game_state
+    return game_from_bytes(state) if state is not None else None
 
-def calculate_bee_bid():
-    """Bees always bid a random amount"""
-    return random.randint(MIN_BET, MIN_BET + 30)
-
-def calculate_auction_payout(winner, player_bid, ai_bid, bee_bid, bee_interruptions):
-    """Calculate payout based on auction winner-takes-all"""
-    total_pot = player_bid + ai_bid + bee_bid
-    
-    if winner == 'Flowers':  # Player wins
-        # Player gets the total pot minus their own bid (net gain)
-        payout = total_pot
-        return payout, total_pot
-    
-    elif winner == 'Butterflies':  # AI wins
-        # Player loses their bid
-        return 0, total_pot
-    
-    elif winner == 'Bees':  # Bees win (board full due to bees)
-        # Bees take all, everyone loses
-        return 0, total_pot
-    
-    else:  # Draw
-        # Everyone gets their bid back
-        return player_bid, total_pot
+def store_game(game):
+    st.session_state.game_state = game.to_bytes()
 
 def reset_game():
     """Reset game"""
+    cancel_ai_move()
     difficulty = st.session_state.difficulty
-    st.session_state.game = GardenTicTacToe(difficulty)
+    store_game(new_game(difficulty))
+    st.session_state.search_stats = []
     st.session_state.current_player = FLOWER
     st.session_state.game_over = False
     st.session_state.winner = None
@@ -680,6 +375,7 @@ def reset_game():
     st.session_state.processing_move = False
     st.session_state.auction_phase = 'bidding'
     st.session_state.auction_complete = False
+    st.session_state.game_key = None
     st.session_state.player_bid = MIN_BET
     st.session_state.ai_bid = 0
     st.session_state.bee_bid = 0
@@ -704,71 +400,31 @@ def get_player_symbol(player):
         return "🐝"
     return "?"
 
-def check_game_over():
+def check_game_over(game):
     """Check game over and calculate auction payouts"""
-    game = st.session_state.game
-    
-    if game.check_win(FLOWER):
-        st.session_state.game_over = True
-        st.session_state.winner = 'Flowers'
-        payout, pot = calculate_auction_payout('Flowers', st.session_state.player_bid, 
-                                               st.session_state.ai_bid, st.session_state.bee_bid,
-                                               game.bee_interruptions)
-        st.session_state.payout_amount = payout
-        st.session_state.total_pot = pot
-        coin_change = payout - st.session_state.player_bid
-        update_player_wallet(coin_change, st.session_state.player_bid, payout)
-        save_game_result('Flowers', game.difficulty, game.move_count, 
-                        game.bee_interruptions, st.session_state.player_bid,
-                        st.session_state.ai_bid, st.session_state.bee_bid,
-                        payout, game.move_history)
-        return True
-    
-    if game.check_win(BUTTERFLY):
-        st.session_state.game_over = True
-        st.session_state.winner = 'Butterflies'
-        payout, pot = calculate_auction_payout('Butterflies', st.session_state.player_bid,
-                                               st.session_state.ai_bid, st.session_state.bee_bid,
-                                               game.bee_interruptions)
-        st.session_state.payout_amount = payout
-        st.session_state.total_pot = pot
-        coin_change = payout - st.session_state.player_bid
-        update_player_wallet(coin_change, st.session_state.player_bid, payout)
-        save_game_result('Butterflies', game.difficulty, game.move_count,
-                        game.bee_interruptions, st.session_state.player_bid,
-                        st.session_state.ai_bid, st.session_state.bee_bid,
-                        payout, game.move_history)
-        return True
-    
-    if game.is_board_full():
-        # Check if it's mostly bees that caused the draw
-        bee_count = sum(1 for i in range(BOARD_SIZE) for j in range(BOARD_SIZE) 
-                       if game.board[i][j] == BEE)
-        
-        if bee_count >= 5:  # Bees significantly disrupted
-            st.session_state.game_over = True
-            st.session_state.winner = 'Bees'
-            payout, pot = calculate_auction_payout('Bees', st.session_state.player_bid,
-                                                   st.session_state.ai_bid, st.session_state.bee_bid,
-                                                   game.bee_interruptions)
-        else:
-            st.session_state.game_over = True
-            st.session_state.winner = 'Draw'
-            payout, pot = calculate_auction_payout('Draw', st.session_state.player_bid,
-                                                   st.session_state.ai_bid, st.session_state.bee_bid,
-                                                   game.bee_interruptions)
-        
-        st.session_state.payout_amount = payout
-        st.session_state.total_pot = pot
-        coin_change = payout - st.session_state.player_bid
-        update_player_wallet(coin_change, st.session_state.player_bid, payout)
-        save_game_result(st.session_state.winner, game.difficulty, game.move_count,
-                        game.bee_interruptions, st.session_state.player_bid,
-                        st.session_state.ai_bid, st.session_state.bee_bid,
-                        payout, game.move_history)
-        return True
+    winner = game_outcome(game)
+    if winner is None:
+        return False
     
-    return False
+    st.session_state.game_over = True
+    st.session_state.winner = winner
+    payout, pot = calculate_auction_payout(winner, st.session_state.player_bid,
+                                           st.session_state.ai_bid, st.session_state.bee_bid,
+                                           game.bee_interruptions)
+    st.session_state.payout_amount = payout
+    st.session_state.total_pot = pot
+    try:
+        settle_game(winner, game.difficulty, game.move_count,
+                    game.bee_interruptions, st.session_state.player_bid,
+                    st.session_state.ai_bid, st.session_state.bee_bid,
+                    payout, game.move_history, summarize_search_stats(st.session_state.search_stats), game.size,
+                    game.win_length, user=get_user_id(), game=st.session_state.game_key,
+                    on_commit=invalidate_statistics)
+    except ValueError:
+        # The reservation went stale and its bid is already back in the balance
+        logger.exception("Could not settle game %s", st.session_state.game_key)
+        st.session_state.ai_message = "⚠️ This game sat idle too long; your bid was returned and it was not recorded"
+    return True
 
 def handle_cell_click(row, col):
     """Handle cell click"""
@@ -776,7 +432,7 @@ def handle_cell_click(row, col):
         return
     
     st.session_state.processing_move = True
-    game = st.session_state.game
+    game = load_game()
     
     if st.session_state.game_over:
         st.session_state.processing_move = False
@@ -792,8 +448,9 @@ def handle_cell_click(row, col):
     if not game.make_move(row, col, st.session_state.current_player):
         st.session_state.processing_move = False
         return
+    store_game(game)
     
-    if check_game_over():
+    if check_game_over(game):
         st.session_state.processing_move = False
         return
     
@@ -803,363 +460,504 @@ def handle_cell_click(row, col):
         if bee_move.row != -1:
             game.make_move(bee_move.row, bee_move.col, BEE)
             game.bee_interruptions += 1
+            store_game(game)
             st.session_state.ai_message = f"🐝 BUZZ! Bee placed at ({bee_move.row}, {bee_move.col})"
-            if check_game_over():
+            if check_game_over(game):
                 st.session_state.processing_move = False
                 return
     else:
         st.session_state.current_player = BUTTERFLY if st.session_state.current_player == FLOWER else FLOWER
-        
-        ai_player = st.session_state.current_player
-        human_player = FLOWER if st.session_state.player_is_flower else BUTTERFLY
-        ai_move, message = game.get_ai_move(ai_player, human_player)
+        # processing_move stays set until poll_ai_move applies the reply
+        start_ai_move()
+        return
+    
+    st.session_state.processing_move = False
+
+def start_ai_move():
+    """Search the AI reply on the executor, on its own copy of the game"""
+    ai_player = st.session_state.current_player
+    human_player = FLOWER if st.session_state.player_is_flower else BUTTERFLY
+    cancel = threading.Event()
+    stats = SearchStats()
+    st.session_state.ai_cancel = cancel
+    st.session_state.ai_stats = stats
+    st.session_state.ai_started = time.monotonic()
+    st.session_state.ai_future = get_ai_executor().submit(
+        search_ai_reply, st.session_state.game_state, ai_player, human_player,
+        table=get_transposition_table(), book=load_opening_book(), cancel=cancel, stats=stats
+    )
+
+def search_ai_reply(game_state, ai_player, human_player, **options):
+    """Executor task: rebuild the game from its state and search the AI move"""
+    return game_from_bytes(game_state).get_ai_move(ai_player, human_player, **options)
+
+def quick_ai_move(game, ai_player):
+    """The Easy one-ply reply in game, for when the search of its difficulty fails"""
+    human_player = BUTTERFLY if ai_player == FLOWER else FLOWER
+    easy = game_from_bytes(game.to_bytes())
+    easy.difficulty = 'Easy'
+    return easy.get_ai_move(ai_player, human_player)
+
+def poll_ai_move():
+    """Apply the AI reply once it is ready; True while it is still being searched"""
+    future = st.session_state.ai_future
+    if future is None:
+        return False
+    
+    if not future.done():
+        if time.monotonic() - st.session_state.ai_started > AI_MOVE_TIMEOUT:
+            st.session_state.ai_cancel.set()
+        return True
+    
+    st.session_state.ai_future = None
+    st.session_state.ai_cancel = None
+    game = load_game()
+    ai_player = st.session_state.current_player
+    try:
+        try:
+            ai_move, message = future.result()
+            st.session_state.search_stats.append(st.session_state.ai_stats)
+        except Exception:
+            logger.exception("AI search failed, playing a quick move instead")
+            ai_move, _ = quick_ai_move(game, ai_player)
+            message = "⚠️ The AI's search failed, so it played a quick move"
+        st.session_state.ai_stats = None
         
         if ai_move.row != -1:
             game.make_move(ai_move.row, ai_move.col, ai_player)
+            store_game(game)
             st.session_state.ai_message = message
             
-            if check_game_over():
-                st.session_state.processing_move = False
-                return
-            
-            st.session_state.current_player = BUTTERFLY if st.session_state.current_player == FLOWER else FLOWER
-    
-    st.session_state.processing_move = False
-
-# Main UI
-st.markdown("""
-<div class="game-header">
-    <div class="game-title">🌸 Garden Auction Tic-Tac-Toe 🦋</div>
-    <div class="game-subtitle">5×5 Board • AI Opponent • Bee Chaos • Auction Betting!</div>
-</div>
-""", unsafe_allow_html=True)
+            if not check_game_over(game):
+                st.session_state.current_player = BUTTERFLY if st.session_state.current_player == FLOWER else FLOWER
+    finally:
+        # Never leave the board locked, even if the fallback fails too
+        st.session_state.processing_move = False
+    return False
 
-# Wallet display
-wallet = get_player_wallet()
+def cancel_ai_move():
+    """Stop any pending AI search and drop its result"""
+    if st.session_state.ai_cancel is not None:
+        st.session_state.ai_cancel.set()
+    st.session_state.ai_future = None
+    st.session_state.ai_cancel = None
+    st.session_state.ai_stats = None
 
-# Check if player is broke
-if wallet['coins'] < MIN_BET and not st.session_state.auction_complete:
-    st.markdown(f"""
-    <div class="broke-banner">
-        <div style="font-size: 3rem;">💸</div>
-        <div>YOU'RE BROKE!</div>
-        <div style="font-size: 1rem; margin-top: 1rem;">
-            You need at least {MIN_BET} coins to play.<br>
-            Current balance: {wallet['coins']} coins
-        </div>
+def main():
+    """Draw the page; Streamlit runs the script as __main__ on every rerun"""
+    st.set_page_config(
+        page_title="Garden Tic-Tac-Toe Auction",
+        page_icon="🌸",
+        layout="centered",
+        initial_sidebar_state="collapsed"
+    )
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
+    init_session_state()
+    
+    st.markdown("""
+    <div class="game-header">
+        <div class="game-title">🌸 Garden Auction Tic-Tac-Toe 🦋</div>
+        <div class="game-subtitle">5×5 Board • AI Opponent • Bee Chaos • Auction Betting!</div>
     </div>
     """, unsafe_allow_html=True)
     
-    col1, col2 = st.columns(2)
-    with col1:
-        if st.button("🔄 Reset Wallet to 1000 Coins", use_container_width=True, type="primary"):
-            reset_wallet()
-            st.rerun()
-    with col2:
-        if st.button("📊 View Statistics", use_container_width=True):
-            st.session_state.show_stats = not st.session_state.show_stats
-else:
-    st.markdown(f"""
-    <div class="auction-card">
-        <div class="coin-balance">💰 Balance: {wallet['coins']} coins</div>
-        <div style="display: grid; grid-template-columns: 1fr 1fr 1fr; gap: 0.5rem; text-align: center;">
-            <div>
-                <div style="font-size: 0.8rem; opacity: 0.8;">Games Played</div>
-                <div style="font-size: 1.2rem; font-weight: bold;">{wallet['games_played']}</div>
-            </div>
-            <div>
-                <div style="font-size: 0.8rem; opacity: 0.8;">Total Wagered</div>
-                <div style="font-size: 1.2rem; font-weight: bold;">{wallet['total_wagered']}</div>
-            </div>
-            <div>
-                <div style="font-size: 0.8rem; opacity: 0.8;">Total Won</div>
-                <div style="font-size: 1.2rem; font-weight: bold;">{wallet['total_won']}</div>
+    # Apply a finished AI reply before drawing, so the board and wallet include it
+    ai_pending = poll_ai_move()
+    
+    # Wallet display
+    wallet = get_player_wallet(get_user_id())
+    
+    # Check if player is broke
+    if wallet['coins'] < MIN_BET and not st.session_state.auction_complete:
+        st.markdown(f"""
+        <div class="broke-banner">
+            <div style="font-size: 3rem;">💸</div>
+            <div>YOU'RE BROKE!</div>
+            <div style="font-size: 1rem; margin-top: 1rem;">
+                You need at least {MIN_BET} coins to play.<br>
+                Current balance: {wallet['coins']} coins
             </div>
         </div>
-    </div>
-    """, unsafe_allow_html=True)
-
-    # Auction Bidding Phase
-    if not st.session_state.auction_complete and not st.session_state.game_over:
-        st.markdown("""
-        <div class="auction-info">
-            <h4 style="margin-top: 0;">🏆 Auction Rules: Winner Takes All!</h4>
-            <ul style="margin: 0.5rem 0;">
-                <li><b>🌺 Player</b>, <b>🦋 AI</b>, and <b>🐝 Bees</b> each place bids</li>
-                <li><b>Winner</b> takes the entire pot (all three bids combined)</li>
-                <li><b>Loser</b> loses their entire bid</li>
-                <li><b>Draw</b>: Everyone gets their bid back</li>
-                <li><b>Bee Victory</b>: If bees disrupt too much (5+ bee placements), bees win the pot!</li>
-            </ul>
-        </div>
         """, unsafe_allow_html=True)
         
-        st.markdown("### 🎲 Place Your Auction Bid")
-        
-        max_bid_allowed = min(MAX_BET, wallet['coins'])
-        
-        # FIX: Ensure max_bid_allowed is at least MIN_BET
-        if max_bid_allowed < MIN_BET:
-            max_bid_allowed = MIN_BET
-        
         col1, col2 = st.columns(2)
-        
         with col1:
-            st.selectbox(
-                "Difficulty",
-                ['Easy', 'Medium', 'Hard'],
-                index=1,
-                key='difficulty'
-            )
-        
+            if st.button("🔄 Reset Wallet to 1000 Coins", use_container_width=True, type="primary"):
+                reset_wallet(get_user_id())
+                st.rerun()
         with col2:
-            st.radio(
-                "Who starts?",
-                ['You (🌺 Flowers)', 'AI (🦋 Butterflies)'],
-                index=0,
-                key='player_first'
-            )
-        
-        # FIX: Only show slider if player has enough coins
-        if wallet['coins'] >= MIN_BET:
-            player_bid = st.slider(
-                "Your Bid (coins)",
-                min_value=MIN_BET,
-                max_value=max_bid_allowed,
-                value=min(50, max_bid_allowed),
-                step=AUCTION_INCREMENT,
-                key='bid_slider'
-            )
-            
-            if st.button("🎮 Place Bid & Start Auction", use_container_width=True, type="primary"):
-                if wallet['coins'] >= player_bid:
-                    st.session_state.player_bid = player_bid
-                    st.session_state.ai_bid = calculate_ai_bid(st.session_state.difficulty, player_bid)
-                    st.session_state.bee_bid = calculate_bee_bid()
-                    st.session_state.total_pot = st.session_state.player_bid + st.session_state.ai_bid + st.session_state.bee_bid
-                    st.session_state.auction_complete = True
-                    st.session_state.game = GardenTicTacToe(st.session_state.difficulty)
-                    
-                    if st.session_state.player_first == 'AI (🦋 Butterflies)':
-                        st.session_state.player_is_flower = False
-                        st.session_state.current_player = BUTTERFLY
-                    else:
-                        st.session_state.player_is_flower = True
-                        st.session_state.current_player = FLOWER
-                    
-                    st.rerun()
-                else:
-                    st.error("❌ Insufficient coins!")
-        else:
-            st.warning(f"⚠️ You need at least {MIN_BET} coins to play!")
-
-    # Show auction results after bidding
-    elif st.session_state.auction_complete and not st.session_state.game_over:
+            if st.button("📊 View Statistics", use_container_width=True):
+                st.session_state.show_stats = not st.session_state.show_stats
+    else:
         st.markdown(f"""
-        <div class="auction-bid">
-            <h3 style="margin-top: 0; text-align: center;">🎰 Auction Complete!</h3>
-            <div class="current-bid">Total Pot: {st.session_state.total_pot} coins</div>
-            <div style="display: grid; grid-template-columns: 1fr 1fr 1fr; gap: 1rem; margin-top: 1rem;">
-                <div style="text-align: center; background: rgba(0,0,0,0.2); padding: 1rem; border-radius: 10px;">
-                    <div style="font-size: 1.5rem;">🌺</div>
-                    <div style="font-weight: bold;">You</div>
-                    <div style="font-size: 1.2rem;">{st.session_state.player_bid} coins</div>
+        <div class="auction-card">
+            <div class="coin-balance">💰 Balance: {wallet['coins']} coins{f" • {wallet['reserved']} in play" if wallet['reserved'] else ''}</div>
+            <div style="display: grid; grid-template-columns: 1fr 1fr 1fr; gap: 0.5rem; text-align: center;">
+                <div>
+                    <div style="font-size: 0.8rem; opacity: 0.8;">Games Played</div>
+                    <div style="font-size: 1.2rem; font-weight: bold;">{wallet['games_played']}</div>
                 </div>
-                <div style="text-align: center; background: rgba(0,0,0,0.2); padding: 1rem; border-radius: 10px;">
-                    <div style="font-size: 1.5rem;">🦋</div>
-                    <div style="font-weight: bold;">AI</div>
-                    <div style="font-size: 1.2rem;">{st.session_state.ai_bid} coins</div>
+                <div>
+                    <div style="font-size: 0.8rem; opacity: 0.8;">Total Wagered</div>
+                    <div style="font-size: 1.2rem; font-weight: bold;">{wallet['total_wagered']}</div>
                 </div>
-                <div style="text-align: center; background: rgba(0,0,0,0.2); padding: 1rem; border-radius: 10px;">
-                    <div style="font-size: 1.5rem;">🐝</div>
-                    <div style="font-weight: bold;">Bees</div>
-                    <div style="font-size: 1.2rem;">{st.session_state.bee_bid} coins</div>
+                <div>
+                    <div style="font-size: 0.8rem; opacity: 0.8;">Total Won</div>
+                    <div style="font-size: 1.2rem; font-weight: bold;">{wallet['total_won']}</div>
                 </div>
             </div>
         </div>
         """, unsafe_allow_html=True)
-
-    # Game board
-    if st.session_state.auction_complete:
-        game = st.session_state.game
-        
-        if st.session_state.ai_message:
-            st.info(st.session_state.ai_message)
-        
-        st.markdown('<div class="game-board">', unsafe_allow_html=True)
-        
-        for i in range(BOARD_SIZE):
-            cols = st.columns(BOARD_SIZE)
-            for j in range(BOARD_SIZE):
-                with cols[j]:
-                    cell = game.board[i][j]
-                    display = get_cell_display(cell)
-                    
-                    if st.button(
-                        display,
-                        key=f"cell_{i}_{j}",
-                        disabled=st.session_state.game_over or cell != EMPTY or st.session_state.processing_move,
-                        use_container_width=True
-                    ):
-                        handle_cell_click(i, j)
-                        st.rerun()
-        
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        # Game info
-        if not st.session_state.game_over:
-            turn_display = "🌺 Your Turn" if (st.session_state.current_player == FLOWER and st.session_state.player_is_flower) or \
-                                             (st.session_state.current_player == BUTTERFLY and not st.session_state.player_is_flower) else "🦋 AI's Turn"
-            
-            st.markdown(f"""
-            <div class="info-card">
-                <h3 style="margin: 0;">{turn_display}</h3>
-                <p style="margin: 0.5rem 0 0 0;">Moves: {game.move_count} | Bee Interruptions: 🐝 {game.bee_interruptions}</p>
+    
+        # Auction Bidding Phase
+        if not st.session_state.auction_complete and not st.session_state.game_over:
+            st.markdown("""
+            <div class="auction-info">
+                <h4 style="margin-top: 0;">🏆 Auction Rules: Winner Takes All!</h4>
+                <ul style="margin: 0.5rem 0;">
+                    <li><b>🌺 Player</b>, <b>🦋 AI</b>, and <b>🐝 Bees</b> each place bids</li>
+                    <li><b>Winner</b> takes the entire pot (all three bids combined)</li>
+                    <li><b>Loser</b> loses their entire bid</li>
+                    <li><b>Draw</b>: Everyone gets their bid back</li>
+                    <li><b>Bee Victory</b>: If bees disrupt too much (5+ bee placements), bees win the pot!</li>
+                </ul>
             </div>
             """, unsafe_allow_html=True)
             
-            # Show move history toggle
-            if st.button("📜 " + ("Hide" if st.session_state.show_moves else "Show") + " Move History", use_container_width=True):
-                st.session_state.show_moves = not st.session_state.show_moves
-                st.rerun()
+            st.markdown("### 🎲 Place Your Auction Bid")
             
-            if st.session_state.show_moves and game.move_history:
-                st.markdown('<div class="move-history">', unsafe_allow_html=True)
-                st.markdown("<h4 style='margin-top: 0;'>📜 Move History</h4>")
-                
-                # Group moves by player
-                flower_moves = []
-                butterfly_moves = []
-                bee_moves = []
-                
-                for idx, (player, row, col) in enumerate(game.move_history, 1):
-                    move_str = f"Move {idx}: ({row}, {col})"
-                    if player == FLOWER:
-                        flower_moves.append(move_str)
-                    elif player == BUTTERFLY:
-                        butterfly_moves.append(move_str)
-                    elif player == BEE:
-                        bee_moves.append(move_str)
-                
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    st.markdown(f"**🌺 Flowers ({len(flower_moves)})**")
-                    for move in flower_moves:
-                        st.markdown(f"<div class='move-item' style='font-size: 0.85rem;'>{move}</div>", unsafe_allow_html=True)
-                
-                with col2:
-                    st.markdown(f"**🦋 Butterflies ({len(butterfly_moves)})**")
-                    for move in butterfly_moves:
-                        st.markdown(f"<div class='move-item' style='font-size: 0.85rem;'>{move}</div>", unsafe_allow_html=True)
-                
-                with col3:
-                    st.markdown(f"**🐝 Bees ({len(bee_moves)})**")
-                    for move in bee_moves:
-                        st.markdown(f"<div class='move-item' style='font-size: 0.85rem;'>{move}</div>", unsafe_allow_html=True)
-                
-                st.markdown('</div>', unsafe_allow_html=True)
-        
-        # Winner display
-        if st.session_state.game_over:
-            winner_emoji = {
-                'Flowers': '🌺',
-                'Butterflies': '🦋',
-                'Bees': '🐝',
-                'Draw': '🤝'
-            }.get(st.session_state.winner, '🎮')
+            max_bid_allowed = min(MAX_BET, wallet['coins'])
             
-            winner_text = {
-                'Flowers': 'YOU WIN!',
-                'Butterflies': 'AI WINS!',
-                'Bees': 'BEES WIN!',
-                'Draw': "IT'S A DRAW!"
-            }.get(st.session_state.winner, 'GAME OVER')
+            # FIX: Ensure max_bid_allowed is at least MIN_BET
+            if max_bid_allowed < MIN_BET:
+                max_bid_allowed = MIN_BET
             
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.selectbox(
+                    "Difficulty",
+                    ['Easy', 'Medium', 'Hard'],
+                    index=1,
+                    key='difficulty'
+                )
+            
+            with col2:
+                st.radio(
+                    "Who starts?",
+                    ['You (🌺 Flowers)', 'AI (🦋 Butterflies)'],
+                    index=0,
+                    key='player_first'
+                )
+            
+            # FIX: Only show slider if player has enough coins
+            if wallet['coins'] >= MIN_BET:
+                player_bid = st.slider(
+                    "Your Bid (coins)",
+                    min_value=MIN_BET,
+                    max_value=max_bid_allowed,
+                    value=min(50, max_bid_allowed),
+                    step=AUCTION_INCREMENT,
+                    key='bid_slider'
+                )
+                
+                if st.button("🎮 Place Bid & Start Auction", use_container_width=True, type="primary"):
+                    # The bid leaves the balance now and is settled when the game ends
+                    game_key = reserve_bet(player_bid, get_user_id())
+                    if game_key:
+                        st.session_state.game_key = game_key
+                        st.session_state.player_bid = player_bid
+                        st.session_state.ai_bid = calculate_ai_bid(st.session_state.difficulty, player_bid)
+                        st.session_state.bee_bid = calculate_bee_bid()
+                        st.session_state.total_pot = st.session_state.player_bid + st.session_state.ai_bid + st.session_state.bee_bid
+                        st.session_state.auction_complete = True
+                        cancel_ai_move()
+                        store_game(new_game(st.session_state.difficulty))
+                        st.session_state.search_stats = []
+                        
+                        if st.session_state.player_first == 'AI (🦋 Butterflies)':
+                            st.session_state.player_is_flower = False
+                            st.session_state.current_player = BUTTERFLY
+                        else:
+                            st.session_state.player_is_flower = True
+                            st.session_state.current_player = FLOWER
+                        
+                        st.rerun()
+                    else:
+                        st.error("❌ Insufficient coins!")
+            else:
+                st.warning(f"⚠️ You need at least {MIN_BET} coins to play!")
+    
+        # Show auction results after bidding
+        elif st.session_state.auction_complete and not st.session_state.game_over:
             st.markdown(f"""
-            <div class="winner-banner">
-                <div style="font-size: 3rem;">{winner_emoji}</div>
-                <div>{winner_text}</div>
-                <div class="win-amount">
-                    Pot: {st.session_state.total_pot} coins<br>
-                    You get: {st.session_state.payout_amount} coins
-                </div>
-                <div style="font-size: 0.9rem; margin-top: 1rem;">
-                    Net: {'+' if st.session_state.payout_amount - st.session_state.player_bid >= 0 else ''}{st.session_state.payout_amount - st.session_state.player_bid} coins
+            <div class="auction-bid">
+                <h3 style="margin-top: 0; text-align: center;">🎰 Auction Complete!</h3>
+                <div class="current-bid">Total Pot: {st.session_state.total_pot} coins</div>
+                <div style="display: grid; grid-template-columns: 1fr 1fr 1fr; gap: 1rem; margin-top: 1rem;">
+                    <div style="text-align: center; background: rgba(0,0,0,0.2); padding: 1rem; border-radius: 10px;">
+                        <div style="font-size: 1.5rem;">🌺</div>
+                        <div style="font-weight: bold;">You</div>
+                        <div style="font-size: 1.2rem;">{st.session_state.player_bid} coins</div>
+                    </div>
+                    <div style="text-align: center; background: rgba(0,0,0,0.2); padding: 1rem; border-radius: 10px;">
+                        <div style="font-size: 1.5rem;">🦋</div>
+                        <div style="font-weight: bold;">AI</div>
+                        <div style="font-size: 1.2rem;">{st.session_state.ai_bid} coins</div>
+                    </div>
+                    <div style="text-align: center; background: rgba(0,0,0,0.2); padding: 1rem; border-radius: 10px;">
+                        <div style="font-size: 1.5rem;">🐝</div>
+                        <div style="font-weight: bold;">Bees</div>
+                        <div style="font-size: 1.2rem;">{st.session_state.bee_bid} coins</div>
+                    </div>
                 </div>
             </div>
             """, unsafe_allow_html=True)
+    
+        # Game board
+        if st.session_state.auction_complete:
+            game = load_game()
+            
+            if st.session_state.ai_message:
+                st.info(st.session_state.ai_message)
+            thinking_slot = st.empty()
             
-            # Show final move history
-            if game.move_history:
-                st.markdown('<div class="move-history">', unsafe_allow_html=True)
-                st.markdown("<h4 style='margin-top: 0;'>📜 Final Move History</h4>")
+            st.markdown('<div class="game-board">', unsafe_allow_html=True)
+            
+            for i in range(game.size):
+                cols = st.columns(game.size)
+                for j in range(game.size):
+                    with cols[j]:
+                        cell = game.board[i][j]
+                        display = get_cell_display(cell)
+                        
+                        if st.button(
+                            display,
+                            key=f"cell_{i}_{j}",
+                            disabled=st.session_state.game_over or cell != EMPTY or st.session_state.processing_move,
+                            use_container_width=True
+                        ):
+                            handle_cell_click(i, j)
+                            st.rerun()
+            
+            st.markdown('</div>', unsafe_allow_html=True)
+            
+            # Game info
+            if not st.session_state.game_over:
+                turn_display = "🌺 Your Turn" if (st.session_state.current_player == FLOWER and st.session_state.player_is_flower) or \
+                                                 (st.session_state.current_player == BUTTERFLY and not st.session_state.player_is_flower) else "🦋 AI's Turn"
                 
-                # Group moves by player
-                flower_moves = []
-                butterfly_moves = []
-                bee_moves = []
+                st.markdown(f"""
+                <div class="info-card">
+                    <h3 style="margin: 0;">{turn_display}</h3>
+                    <p style="margin: 0.5rem 0 0 0;">Moves: {game.move_count} | Bee Interruptions: 🐝 {game.bee_interruptions}</p>
+                </div>
+                """, unsafe_allow_html=True)
                 
-                for idx, (player, row, col) in enumerate(game.move_history, 1):
-                    move_str = f"Move {idx}: ({row}, {col})"
-                    if player == FLOWER:
-                        flower_moves.append(move_str)
-                    elif player == BUTTERFLY:
-                        butterfly_moves.append(move_str)
-                    elif player == BEE:
-                        bee_moves.append(move_str)
+                # Show move history toggle
+                if st.button("📜 " + ("Hide" if st.session_state.show_moves else "Show") + " Move History", use_container_width=True):
+                    st.session_state.show_moves = not st.session_state.show_moves
+                    st.rerun()
                 
-                col1, col2, col3 = st.columns(3)
+                if st.session_state.show_moves and game.move_history:
+                    st.markdown('<div class="move-history">', unsafe_allow_html=True)
+                    st.markdown("<h4 style='margin-top: 0;'>📜 Move History</h4>")
+                    
+                    # Group moves by player
+                    flower_moves = []
+                    butterfly_moves = []
+                    bee_moves = []
+                    
+                    for idx, (player, row, col) in enumerate(game.move_history, 1):
+                        move_str = f"Move {idx}: ({row}, {col})"
+                        if player == FLOWER:
+                            flower_moves.append(move_str)
+                        elif player == BUTTERFLY:
+                            butterfly_moves.append(move_str)
+                        elif player == BEE:
+                            bee_moves.append(move_str)
+                    
+                    col1, col2, col3 = st.columns(3)
+                    
+                    with col1:
+                        st.markdown(f"**🌺 Flowers ({len(flower_moves)})**")
+                        for move in flower_moves:
+                            st.markdown(f"<div class='move-item' style='font-size: 0.85rem;'>{move}</div>", unsafe_allow_html=True)
+                    
+                    with col2:
+                        st.markdown(f"**🦋 Butterflies ({len(butterfly_moves)})**")
+                        for move in butterfly_moves:
+                            st.markdown(f"<div class='move-item' style='font-size: 0.85rem;'>{move}</div>", unsafe_allow_html=True)
+                    
+                    with col3:
+                        st.markdown(f"**🐝 Bees ({len(bee_moves)})**")
+                        for move in bee_moves:
+                            st.markdown(f"<div class='move-item' style='font-size: 0.85rem;'>{move}</div>", unsafe_allow_html=True)
+                    
+                    st.markdown('</div>', unsafe_allow_html=True)
+            
+            # Winner display
+            if st.session_state.game_over:
+                winner_emoji = {
+                    'Flowers': '🌺',
+                    'Butterflies': '🦋',
+                    'Bees': '🐝',
+                    'Draw': '🤝'
+                }.get(st.session_state.winner, '🎮')
                 
-                with col1:
-                    st.markdown(f"**🌺 Flowers ({len(flower_moves)})**")
-                    for move in flower_moves:
-                        st.markdown(f"<div class='move-item' style='font-size: 0.85rem;'>{move}</div>", unsafe_allow_html=True)
+                winner_text = {
+                    'Flowers': 'YOU WIN!',
+                    'Butterflies': 'AI WINS!',
+                    'Bees': 'BEES WIN!',
+                    'Draw': "IT'S A DRAW!"
+                }.get(st.session_state.winner, 'GAME OVER')
                 
-                with col2:
-                    st.markdown(f"**🦋 Butterflies ({len(butterfly_moves)})**")
-                    for move in butterfly_moves:
-                        st.markdown(f"<div class='move-item' style='font-size: 0.85rem;'>{move}</div>", unsafe_allow_html=True)
+                st.markdown(f"""
+                <div class="winner-banner">
+                    <div style="font-size: 3rem;">{winner_emoji}</div>
+                    <div>{winner_text}</div>
+                    <div class="win-amount">
+                        Pot: {st.session_state.total_pot} coins<br>
+                        You get: {st.session_state.payout_amount} coins
+                    </div>
+                    <div style="font-size: 0.9rem; margin-top: 1rem;">
+                        Net: {'+' if st.session_state.payout_amount - st.session_state.player_bid >= 0 else ''}{st.session_state.payout_amount - st.session_state.player_bid} coins
+                    </div>
+                </div>
+                """, unsafe_allow_html=True)
                 
-                with col3:
-                    st.markdown(f"**🐝 Bees ({len(bee_moves)})**")
-                    for move in bee_moves:
-                        st.markdown(f"<div class='move-item' style='font-size: 0.85rem;'>{move}</div>", unsafe_allow_html=True)
+                # Show final move history
+                if game.move_history:
+                    st.markdown('<div class="move-history">', unsafe_allow_html=True)
+                    st.markdown("<h4 style='margin-top: 0;'>📜 Final Move History</h4>")
+                    
+                    # Group moves by player
+                    flower_moves = []
+                    butterfly_moves = []
+                    bee_moves = []
+                    
+                    for idx, (player, row, col) in enumerate(game.move_history, 1):
+                        move_str = f"Move {idx}: ({row}, {col})"
+                        if player == FLOWER:
+                            flower_moves.append(move_str)
+                        elif player == BUTTERFLY:
+                            butterfly_moves.append(move_str)
+                        elif player == BEE:
+                            bee_moves.append(move_str)
+                    
+                    col1, col2, col3 = st.columns(3)
+                    
+                    with col1:
+                        st.markdown(f"**🌺 Flowers ({len(flower_moves)})**")
+                        for move in flower_moves:
+                            st.markdown(f"<div class='move-item' style='font-size: 0.85rem;'>{move}</div>", unsafe_allow_html=True)
+                    
+                    with col2:
+                        st.markdown(f"**🦋 Butterflies ({len(butterfly_moves)})**")
+                        for move in butterfly_moves:
+                            st.markdown(f"<div class='move-item' style='font-size: 0.85rem;'>{move}</div>", unsafe_allow_html=True)
+                    
+                    with col3:
+                        st.markdown(f"**🐝 Bees ({len(bee_moves)})**")
+                        for move in bee_moves:
+                            st.markdown(f"<div class='move-item' style='font-size: 0.85rem;'>{move}</div>", unsafe_allow_html=True)
+                    
+                    st.markdown('</div>', unsafe_allow_html=True)
                 
-                st.markdown('</div>', unsafe_allow_html=True)
-            
+                col1, col2 = st.columns(2)
+                with col1:
+                    if st.button("🔄 Play Again", use_container_width=True):
+                        reset_game()
+                        st.rerun()
+                
+                with col2:
+                    if st.button("📊 View Statistics", use_container_width=True):
+                        st.session_state.show_stats = not st.session_state.show_stats
+    
+    # AI debug panel
+    if st.session_state.auction_complete and st.checkbox("🔧 Show AI search stats", key='show_debug'):
+        records = st.session_state.search_stats
+        if records:
+            st.markdown("**This game**")
+            frame = pd.DataFrame([record.as_dict() for record in records])
+            frame.index = range(1, len(frame) + 1)
+            frame['wall_time'] = (frame['wall_time'] * 1000).round(1)
+            st.dataframe(frame.rename(columns={'wall_time': 'time_ms'}), use_container_width=True)
+            branches = summarize_search_stats(records)['branches']
+            st.caption(" • ".join(f"{branch}: {branches[branch]}" for branch in SEARCH_BRANCHES if branches[branch]))
+        search_history = get_search_statistics()
+        if search_history:
+            st.markdown("**All saved games**")
+            st.dataframe(pd.DataFrame(search_history).set_index('difficulty').round(1), use_container_width=True)
+        storage = storage_metrics()
+        if 'in_use' in storage:
+            st.caption(f"Storage: {storage['backend']} • pool {storage['in_use']} in use / {storage['open']} open • "
+                       f"{storage['created']} opened • checkout wait {storage['mean_wait'] * 1000:.1f} ms mean, "
+                       f"{storage['max_wait'] * 1000:.0f} ms max")
+        else:
+            st.caption(f"Storage: {storage['backend']} • {storage['users']} wallets • {storage['games']} games")
+    
+    # Statistics
+    if st.session_state.show_stats:
+        hours = STATS_PERIODS[st.selectbox("📅 Period", list(STATS_PERIODS), key='stats_period')]
+        stats = get_statistics() if hours is None else get_window_statistics(hours)
+        
+        st.markdown(f"""
+        <div class="stats-card">
+            <h3 style="margin-top: 0;">📊 Game Statistics</h3>
+            <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 1rem;">
+                <div>
+                    <p><b>🌺 Player Wins:</b> {stats['flower_wins']}</p>
+                    <p><b>🦋 AI Wins:</b> {stats['butterfly_wins']}</p>
+                    <p><b>🤝 Draws:</b> {stats['draws']}</p>
+                </div>
+                <div>
+                    <p><b>📈 Avg Moves:</b> {stats['avg_moves']:.1f}</p>
+                    <p><b>🐝 Total Bees:</b> {stats['total_bees']}</p>
+                    <p><b>💰 Total Payout:</b> {stats['total_payout']}</p>
+                </div>
+            </div>
+            <div style="margin-top: 1rem; padding-top: 1rem; border-top: 1px solid rgba(255,255,255,0.2);">
+                <p><b>💵 Avg Player Bid:</b> {stats['avg_player_bid']:.0f} coins</p>
+                <p><b>🤖 Avg AI Bid:</b> {stats['avg_ai_bid']:.0f} coins</p>
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        if hours is None:
+            by_difficulty = get_difficulty_statistics()
+            if by_difficulty:
+                frame = pd.DataFrame(by_difficulty).set_index('difficulty')
+                st.dataframe(frame[['games', 'flower_wins', 'butterfly_wins', 'bee_wins', 'draws', 'avg_moves',
+                                    'avg_player_bid', 'total_payout']].round(1), use_container_width=True)
+        else:
+            history = get_history(hours)
+            if history:
+                st.bar_chart(pd.DataFrame(history).set_index('bucket')[['flower_wins', 'butterfly_wins', 'bee_wins',
+                                                                        'draws']])
+        
+        # Recent games, paged by the last id shown
+        pages = st.session_state.history_pages
+        recent = get_recent_games(pages[-1] if pages else None)
+        if recent:
+            st.markdown("**Recent games**")
+            st.dataframe(pd.DataFrame(recent).set_index('id'), use_container_width=True)
             col1, col2 = st.columns(2)
             with col1:
-                if st.button("🔄 Play Again", use_container_width=True):
-                    reset_game()
+                if pages and st.button("◀ Newer", use_container_width=True):
+                    pages.pop()
                     st.rerun()
-            
             with col2:
-                if st.button("📊 View Statistics", use_container_width=True):
-                    st.session_state.show_stats = not st.session_state.show_stats
-
-# Statistics
-if st.session_state.show_stats:
-    stats = get_statistics()
+                if len(recent) == RECENT_GAMES_PAGE and st.button("Older ▶", use_container_width=True):
+                    pages.append(recent[-1]['id'])
+                    st.rerun()
     
-    st.markdown(f"""
-    <div class="stats-card">
-        <h3 style="margin-top: 0;">📊 Game Statistics</h3>
-        <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 1rem;">
-            <div>
-                <p><b>🌺 Player Wins:</b> {stats['flower_wins']}</p>
-                <p><b>🦋 AI Wins:</b> {stats['butterfly_wins']}</p>
-                <p><b>🤝 Draws:</b> {stats['draws']}</p>
-            </div>
-            <div>
-                <p><b>📈 Avg Moves:</b> {stats['avg_moves']:.1f}</p>
-                <p><b>🐝 Total Bees:</b> {stats['total_bees']}</p>
-                <p><b>💰 Total Payout:</b> {stats['total_payout']}</p>
-            </div>
-        </div>
-        <div style="margin-top: 1rem; padding-top: 1rem; border-top: 1px solid rgba(255,255,255,0.2);">
-            <p><b>💵 Avg Player Bid:</b> {stats['avg_player_bid']:.0f} coins</p>
-            <p><b>🤖 Avg AI Bid:</b> {stats['avg_ai_bid']:.0f} coins</p>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    # Keep polling a pending AI reply; every rerun redraws the board as it stands
+    if ai_pending and st.session_state.auction_complete:
+        with thinking_slot.container():
+            with st.spinner("🤖 AI is thinking..."):
+                time.sleep(AI_POLL_INTERVAL)
+        st.rerun()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Parity of the vectorized and batch move scoring with the scalar engine"""
+import random
+
+import pytest
+
+import garden_engine
+from garden_engine import (
+    EMPTY, FLOWER, BUTTERFLY, BEE, PIECE_CODES, new_game, best_moves_batch,
+    score_candidates_scalar, score_candidates_vectorized
+)
+
+# (board size, win length) pairs covering square and short-line variants
+GEOMETRIES = [(5, 5), (5, 4), (6, 4), (9, 5), (9, 4), (15, 5)]
+POSITIONS = 40
+# Deep enough for a bee to land on the board the root side moves on
+EXPECTIMAX_DEPTH = 2
+
+def _corpus(board_size, win_length, seed=20240601):
+    """Random positions from empty to nearly full, bees mixed in, with their side to move"""
+    rng = random.Random(f'{seed}/{board_size}/{win_length}')
+    positions = []
+    for _ in range(POSITIONS):
+        game = new_game('Easy', board_size, win_length)
+        cells = [(i, j) for i in range(board_size) for j in range(board_size)]
+        rng.shuffle(cells)
+        for row, col in cells[:rng.randint(0, len(cells) - 1)]:
+            game.make_move(row, col, rng.choice((FLOWER, BUTTERFLY, FLOWER, BUTTERFLY, BEE)))
+        positions.append((game, rng.choice((FLOWER, BUTTERFLY))))
+    return positions
+
+def _other(player):
+    return BUTTERFLY if player == FLOWER else FLOWER
+
+def _scalar_best(game, player):
+    cells, scores = score_candidates_scalar(game, player, _other(player))
+    if not cells:
+        return -1, 0
+    best = scores.index(max(scores))
+    return cells[best], scores[best]
+
+def _board_codes(game):
+    return [PIECE_CODES[cell] for row in game.board for cell in row]
+
+@pytest.mark.parametrize('board_size, win_length', GEOMETRIES)
+def test_vectorized_scores_match_scalar(board_size, win_length):
+    pytest.importorskip('numpy')
+    for game, player in _corpus(board_size, win_length):
+        cells, scores = score_candidates_scalar(game, player, _other(player))
+        array_cells, array_scores = score_candidates_vectorized(game, player, _other(player))
+        assert array_cells.tolist() == cells
+        assert array_scores.tolist() == scores
+
+@pytest.mark.parametrize('board_size, win_length', GEOMETRIES)
+def test_batch_best_moves_match_scalar(board_size, win_length):
+    pytest.importorskip('numpy')
+    positions = _corpus(board_size, win_length)
+    boards = [_board_codes(game) for game, _ in positions]
+    sides = [PIECE_CODES[player] for _, player in positions]
+    # A small chunk size so positions straddle chunk boundaries
+    moves, scores = best_moves_batch(boards, sides, board_size, win_length, chunk_size=7)
+    expected = [_scalar_best(game, player) for game, player in positions]
+    assert list(zip(moves.tolist(), scores.tolist())) == expected
+
+@pytest.mark.parametrize('board_size, win_length', GEOMETRIES[:3])
+def test_batch_without_numpy_matches_scalar(monkeypatch, board_size, win_length):
+    positions = _corpus(board_size, win_length)
+    boards = [_board_codes(game) for game, _ in positions]
+    sides = [PIECE_CODES[player] for _, player in positions]
+    monkeypatch.setattr(garden_engine, 'np', None)
+    monkeypatch.setattr(garden_engine, 'VECTORIZED_EVAL', False)
+    moves, scores = best_moves_batch(boards, sides, board_size, win_length)
+    assert list(zip(moves, scores)) == [_scalar_best(game, player) for game, player in positions]
+
+def _occupancy(game):
+    empty = game.first_empty_cell()
+    return ((empty.row, empty.col), game.is_board_full(),
+            [game.count_pieces(piece) for piece in (FLOWER, BUTTERFLY, BEE)])
+
+@pytest.mark.parametrize('board_size, win_length', GEOMETRIES[:3])
+def test_bitboard_occupancy_matches_list(board_size, win_length):
+    rng = random.Random(f'bitboard/{board_size}/{win_length}')
+    for _ in range(POSITIONS):
+        game = garden_engine.GardenTicTacToe('Easy', board_size, win_length)
+        bitboard = garden_engine.BitboardGardenTicTacToe('Easy', board_size, win_length)
+        cells = [(i, j) for i in range(board_size) for j in range(board_size)]
+        rng.shuffle(cells)
+        # Up to a full board, then some moves taken back
+        for row, col in cells[:rng.randint(0, len(cells))]:
+            piece = rng.choice((FLOWER, BUTTERFLY, BEE))
+            game.make_move(row, col, piece)
+            bitboard.make_move(row, col, piece)
+        for _ in range(rng.randint(0, 3)):
+            game.undo_move()
+            bitboard.undo_move()
+        assert _occupancy(bitboard) == _occupancy(game)
+        assert _occupancy(garden_engine.BitboardGardenTicTacToe.from_bytes(bitboard.to_bytes())) == _occupancy(game)
+
+def test_batch_of_full_board_has_no_move():
+    board = [PIECE_CODES[BEE]] * 25
+    board[0] = PIECE_CODES[EMPTY]
+    moves, scores = best_moves_batch([board, [PIECE_CODES[BEE]] * 25], PIECE_CODES[FLOWER])
+    assert list(moves) == [0, -1]
+    assert scores[1] == 0
+
+def _expectimax(game, side, other, depth, ply, human, bee_chance):
+    """Unpruned, table-free value of the model ExpectimaxSearch searches"""
+    if depth == 0:
+        return game.scores[side] - game.scores[other]
+    best = None
+    for row, col in game.candidate_moves():
+        if game.completes_line(row, col, side):
+            return garden_engine.WIN_SCORE - ply
+        game.make_move(row, col, side)
+        score = -_expectimax(game, other, side, depth - 1, ply + 1, human, bee_chance)
+        if side == human and game.move_count > garden_engine.BEE_MIN_MOVES:
+            bee_move = game.get_strategic_bee_move(other)
+            if bee_move.row != -1:
+                game.make_move(bee_move.row, bee_move.col, BEE)
+                again = _expectimax(game, side, other, depth - 1, ply + 1, human, bee_chance)
+                game.undo_move()
+                score = (1 - bee_chance) * score + bee_chance * again
+        game.undo_move()
+        best = score if best is None else max(best, score)
+    return 0 if best is None else best
+
+def _images(game):
+    """The game's position under each of the board's 8 symmetries"""
+    images = []
+    for perm in game.geometry.symmetries:
+        image = new_game(game.difficulty, game.size, game.win_length)
+        for player, row, col in game.move_history:
+            image.make_move(*divmod(perm[row * game.size + col], game.size), player)
+        images.append(image)
+    return images
+
+def test_expectimax_table_shared_across_mirror_images():
+    rng = random.Random(20240612)
+    table = garden_engine.TranspositionTable()
+    for _ in range(6):
+        game = new_game('Hard')
+        cells = [(i, j) for i in range(game.size) for j in range(game.size)]
+        rng.shuffle(cells)
+        for index, (row, col) in enumerate(cells[:7]):
+            game.make_move(row, col, FLOWER if index % 2 == 0 else BUTTERFLY)
+        if game.check_win(FLOWER) or game.check_win(BUTTERFLY):
+            continue
+        # Images searched one after another, as the app's and book builder's shared tables see them
+        for image in _images(game):
+            search = garden_engine.ExpectimaxSearch(image, EXPECTIMAX_DEPTH, table=table, human=FLOWER, bee_chance=0.3)
+            score = search.negamax(FLOWER, BUTTERFLY, EXPECTIMAX_DEPTH, float('-inf'), float('inf'), 0)
+            assert score == pytest.approx(_expectimax(image, FLOWER, BUTTERFLY, EXPECTIMAX_DEPTH, 0, FLOWER, 0.3))
@@ -0,0 +1,87 @@
+"""Every storage backend answers the same reads for the same games"""
+import random
+import time
+
+import pytest
+
+import garden_storage
+from garden_engine import FLOWER, BUTTERFLY, BEE
+
+GAMES = 120
+USERS = 4
+
+def _play(games=GAMES, seed=7):
+    """Reserve and settle a seeded run of games, some with search totals"""
+    rng = random.Random(seed)
+    for index in range(games):
+        user = f'user{index % USERS}'
+        bid = rng.choice((10, 50, 400))
+        game = garden_storage.reserve_bet(bid, user)
+        if not game:
+            continue
+        cells = rng.sample([(row, col) for row in range(5) for col in range(5)], rng.randint(3, 12))
+        moves = [(rng.choice((FLOWER, BUTTERFLY, BEE)), row, col) for row, col in cells]
+        search = {'ai_moves': 3, 'total_time': 0.25, 'max_time': 0.125, 'total_nodes': rng.randint(1, 500),
+                  'max_depth': rng.randint(1, 8), 'tt_hits': 2, 'branches': {'search': 3}} if index % 3 else None
+        garden_storage.settle_game(rng.choice(('Flowers', 'Butterflies', 'Bees', 'Draw')),
+                                   rng.choice(('Easy', 'Medium', 'Hard')), len(moves), rng.randint(0, 3), bid,
+                                   rng.randint(10, 60), 20, rng.choice((0, bid, 3 * bid)), moves, search,
+                                   user=user, game=game, write_behind=False)
+
+def _reads():
+    return {
+        'statistics': garden_storage.load_statistics(),
+        'by_difficulty': garden_storage.load_statistics_by('difficulty'),
+        'by_day': garden_storage.load_statistics_by('day'),
+        'since': garden_storage.load_statistics_since(24),
+        'history': garden_storage.load_history(48, 'hour'),
+        'search': garden_storage.load_search_statistics(),
+        'wallets': [garden_storage.get_player_wallet(f'user{index}') for index in range(USERS)],
+        'moves': garden_storage.load_game_moves(5)
+    }
+
+@pytest.fixture
+def backends(tmp_path, monkeypatch):
+    # Every game stamped at one moment, so no backend's games fall in a later hour or day bucket
+    stamp = garden_storage._utc_timestamp(time.time() - 60)
+    utc_timestamp = garden_storage._utc_timestamp
+    monkeypatch.setattr(garden_storage, '_utc_timestamp',
+                        lambda seconds=None: stamp if seconds is None else utc_timestamp(seconds))
+    options = {'sqlite': {'path': str(tmp_path / 'garden.db')}, 'memory': {},
+               'log': {'path': str(tmp_path / 'garden.log')}}
+    yield options
+    garden_storage.use_storage('memory')
+
+# A single game leaves every rollup key holding one game's terms as they came
+@pytest.mark.parametrize('games', [1, GAMES])
+def test_backends_agree(backends, games):
+    reads = {}
+    for backend, options in backends.items():
+        garden_storage.use_storage(backend, **options)
+        _play(games)
+        reads[backend] = _reads()
+    assert reads['sqlite']['statistics']['games'] > 0
+    # repr, so an int and an equal bool or float still differ
+    for backend in ('memory', 'log'):
+        for name, value in reads['sqlite'].items():
+            assert repr(reads[backend][name]) == repr(value), (backend, name)
+
+def test_log_replays_to_the_same_state(backends):
+    garden_storage.use_storage('log', **backends['log'])
+    _play()
+    before = _reads()
+    garden_storage.use_storage('memory')
+    garden_storage.use_storage('log', **backends['log'])
+    assert repr(_reads()) == repr(before)
+
+@pytest.mark.parametrize('backend', ['sqlite', 'memory', 'log'])
+def test_game_replays_under_its_own_rules(backends, backend):
+    garden_storage.use_storage(backend, **backends[backend])
+    # Four in a row wins on a 6x6 board with a win length of 4, not under the default 5
+    moves = [(FLOWER, 0, col) for col in range(4)]
+    game = garden_storage.reserve_bet(10, 'user0')
+    garden_storage.settle_game('Flowers', 'Easy', len(moves), 0, 10, 10, 20, 30, moves, board_size=6, win_length=4,
+                               user='user0', game=game, write_behind=False)
+    position = garden_storage.load_game_position(1)
+    assert (position.size, position.win_length) == (6, 4)
+    assert position.check_win(FLOWER)